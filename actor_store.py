@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+
+if TYPE_CHECKING:
+    from entity import Actor
+
+# One row of actor state, stored as columns so it can be processed with numpy.
+actor_dt = np.dtype(
+    [
+        ("x", np.int32),
+        ("y", np.int32),
+        ("hp", np.int32),
+        ("max_hp", np.int32),
+        ("power", np.int32),
+        ("defense", np.int32),
+        ("alive", bool),
+    ]
+)
+
+# The width and height in tiles of the cells of the grid used for spatial queries.
+GRID_CELL_SIZE = 8
+
+# Grid cell keys are (cell x << _KEY_SHIFT) + cell y, so that the cells of one
+# column of the grid sort next to each other.
+_KEY_SHIFT = 20
+
+
+class ActorStore:
+    """
+    A columnar copy of the state of every actor on a GameMap.
+
+    The actor objects are still what the game reads and writes, the store is kept
+    in step with them whenever they move, take damage, die or change equipment.
+    Effects which need to look at many actors at once, such as area damage and
+    targeting, can then be done as array operations instead of Python loops.
+
+    Spatial queries go through a uniform grid of the living actors, which is
+    rebuilt on the next query after any actor has moved, died or been added or
+    removed.
+    """
+
+    def __init__(self, capacity: int = 32):
+        self._data = np.zeros(capacity, dtype=actor_dt)
+        self.actors: List[Actor] = []
+        self.index_of: Dict[Actor, int] = {}
+        # The sorted cell keys of the living actors and their indexes in the same
+        # order, or None when positions have changed since the grid was built.
+        self._grid: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def __getstate__(self) -> dict:
+        """Leave the grid out of saves, it is rebuilt when needed."""
+        state = self.__dict__.copy()
+        state["_grid"] = None
+        return state
+
+    def __len__(self) -> int:
+        return len(self.actors)
+
+    def __contains__(self, actor: Actor) -> bool:
+        return actor in self.index_of
+
+    @property
+    def data(self) -> np.ndarray:
+        """The rows of the actors in this store, in the same order as `actors`."""
+        return self._data[: len(self.actors)]
+
+    def add(self, actor: Actor) -> None:
+        if actor in self.index_of:
+            self.update(actor)
+            return
+
+        index = len(self.actors)
+        if index == len(self._data):
+            self._data = np.resize(self._data, len(self._data) * 2)
+
+        self.actors.append(actor)
+        self.index_of[actor] = index
+        self._grid = None
+        self.update(actor)
+
+    def remove(self, actor: Actor) -> None:
+        """Remove an actor by moving the last row into its place."""
+        index = self.index_of.pop(actor)
+        last = self.actors.pop()
+        self._grid = None
+        if last is not actor:
+            self.actors[index] = last
+            self.index_of[last] = index
+            self._data[index] = self._data[len(self.actors)]
+
+    def update_position(self, actor: Actor) -> None:
+        index = self.index_of.get(actor)
+        if index is not None:
+            self._data["x"][index] = actor.x
+            self._data["y"][index] = actor.y
+            self._grid = None
+
+    def update(self, actor: Actor) -> None:
+        """Copy every column from the actor object."""
+        index = self.index_of.get(actor)
+        if index is None:
+            return
+        fighter = actor.fighter
+        row = self._data[index]
+        if (row["x"], row["y"], row["alive"]) != (actor.x, actor.y, actor.is_alive):
+            self._grid = None
+        self._data[index] = (
+            actor.x,
+            actor.y,
+            fighter.hp,
+            fighter.max_hp,
+            fighter.power,
+            fighter.defense,
+            actor.is_alive,
+        )
+
+    def living_indexes(self) -> np.ndarray:
+        """Return the indexes of living actors, ordered by position."""
+        data = self.data
+        indexes = np.flatnonzero(data["alive"])
+        order = np.lexsort((data["y"][indexes], data["x"][indexes]))
+        return indexes[order]
+
+    def actor_at(self, x: int, y: int) -> Optional[Actor]:
+        """Return the living actor at (x, y), if there is one."""
+        data = self.data
+        found = np.flatnonzero(data["alive"] & (data["x"] == x) & (data["y"] == y))
+        if len(found):
+            return self.actors[found[0]]
+        return None
+
+    def distances(self, x: int, y: int) -> np.ndarray:
+        """Return the distance from (x, y) to every actor in the store."""
+        data = self.data
+        return np.hypot(data["x"] - x, data["y"] - y)
+
+    def _build_grid(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._grid is None:
+            data = self.data
+            indexes = np.flatnonzero(data["alive"])
+            keys = (data["x"][indexes].astype(np.int64) // GRID_CELL_SIZE) << _KEY_SHIFT
+            keys += data["y"][indexes] // GRID_CELL_SIZE
+            order = np.argsort(keys, kind="stable")
+            self._grid = keys[order], indexes[order]
+        return self._grid
+
+    def indexes_in_rect(
+        self, left: int, top: int, right: int, bottom: int
+    ) -> np.ndarray:
+        """
+        Return the indexes of the living actors with left <= x < right and
+        top <= y < bottom, in ascending order.
+        """
+        if right <= left or bottom <= top:
+            return np.zeros(0, dtype=np.intp)
+        keys, indexes = self._build_grid()
+        first_y = max(top, 0) // GRID_CELL_SIZE
+        last_y = max(bottom - 1, 0) // GRID_CELL_SIZE
+        found = []
+        # Each column of grid cells is one run of the sorted keys.
+        for cell_x in range(
+            max(left, 0) // GRID_CELL_SIZE, max(right - 1, 0) // GRID_CELL_SIZE + 1
+        ):
+            column = cell_x << _KEY_SHIFT
+            start, stop = np.searchsorted(keys, (column + first_y, column + last_y + 1))
+            if stop > start:
+                found.append(indexes[start:stop])
+        if not found:
+            return np.zeros(0, dtype=np.intp)
+
+        candidates = np.sort(np.concatenate(found))
+        data = self._data
+        xs, ys = data["x"][candidates], data["y"][candidates]
+        inside = (left <= xs) & (xs < right) & (top <= ys) & (ys < bottom)
+        return candidates[inside]
+
+    def in_rect(self, left: int, top: int, right: int, bottom: int) -> List[Actor]:
+        """Return every living actor with left <= x < right and top <= y < bottom."""
+        return [self.actors[i] for i in self.indexes_in_rect(left, top, right, bottom)]
+
+    def in_radius(self, x: int, y: int, radius: float) -> List[Actor]:
+        """Return every living actor within `radius` of (x, y)."""
+        reach = int(radius)
+        candidates = self.indexes_in_rect(
+            x - reach, y - reach, x + reach + 1, y + reach + 1
+        )
+        data = self._data
+        distances = np.hypot(data["x"][candidates] - x, data["y"][candidates] - y)
+        return [self.actors[i] for i in candidates[distances <= radius]]
+
+    def nearest(
+        self,
+        x: int,
+        y: int,
+        max_distance: float,
+        accept: Optional[Callable[[Actor], bool]] = None,
+    ) -> Optional[Actor]:
+        """
+        Return the closest living actor to (x, y) which is within `max_distance`.
+
+        `accept` can limit the candidates, it is only called on actors in range,
+        closest first, until one is accepted.  Ties go to the actor added first.
+        """
+        reach = int(max_distance)
+        candidates = self.indexes_in_rect(
+            x - reach, y - reach, x + reach + 1, y + reach + 1
+        )
+        data = self._data
+        distances = np.hypot(data["x"][candidates] - x, data["y"][candidates] - y)
+        order = np.argsort(distances, kind="stable")
+        for i in order:
+            if distances[i] > max_distance:
+                break
+            actor = self.actors[candidates[i]]
+            if accept is None or accept(actor):
+                return actor
+        return None
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import Tuple
+
+
+class Camera:
+    """
+    The part of the map which is drawn to the screen.
+
+    `x` and `y` are the map position of the top left corner of the view.  Maps which
+    are smaller than the view are drawn from the top left corner of the screen.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.x = 0
+        self.y = 0
+
+    def center_on(self, x: int, y: int, map_width: int, map_height: int) -> None:
+        """Move the view so (x, y) is in the middle, without going past the map."""
+        self.x = max(0, min(x - self.width // 2, map_width - self.width))
+        self.y = max(0, min(y - self.height // 2, map_height - self.height))
+
+    def view_slices(self, map_width: int, map_height: int) -> Tuple[slice, slice]:
+        """Return the part of the map which is in view as a 2D array index."""
+        return (
+            slice(self.x, min(self.x + self.width, map_width)),
+            slice(self.y, min(self.y + self.height, map_height)),
+        )
+
+    def to_screen(self, x: int, y: int) -> Tuple[int, int]:
+        return x - self.x, y - self.y
+
+    def to_map(self, x: int, y: int) -> Tuple[int, int]:
+        return x + self.x, y + self.y
+
+    def in_view(self, x: int, y: int) -> bool:
+        """Return True if the map position (x, y) is on screen."""
+        return self.x <= x < self.x + self.width and self.y <= y < self.y + self.height
@@ -14,6 +14,7 @@ enemy_die = (0xFF, 0xA0, 0x30)
 invalid = (0xFF, 0xFF, 0x00)
 impossible = (0x80, 0x80, 0x80)
 error = (0xFF, 0x40, 0x40)
+debug = (0xC0, 0xC0, 0x40)
 
 welcome_text = (0x20, 0xA0, 0xFF)
 health_recovered = (0x0, 0xFF, 0x0)
@@ -1,77 +1,190 @@
 from __future__ import annotations
 
-import random
-from typing import List, Optional, Tuple, TYPE_CHECKING
+from typing import FrozenSet, List, Optional, Tuple, TYPE_CHECKING
 
 import numpy as np  # type: ignore
 import tcod
 
 from actions import Action, BumpAction, MeleeAction, MovementAction, WaitAction
+import exceptions
 
 if TYPE_CHECKING:
+    from distance_maps import DistanceMaps
+    from engine import Engine
     from entity import Actor
 
 
+# How far around the start and destination a path may wander before the search
+# falls back to the whole map.
+PATH_MARGIN = 16
+
+# How far around the player the distance map used for chasing reaches.  Enemies
+# only start chasing from inside the players view, and this leaves room for the
+# way to the player to go around obstacles.
+CHASE_RADIUS = 24
+
+
+class AISnapshot:
+    """
+    The state of a floor at the start of the enemies turns, which AIs plan from.
+
+    Nothing in the snapshot changes while AIs plan, so plans don't depend on the
+    order they are made in, and they can be made on several threads at once.
+    """
+
+    __slots__ = ("player_xy", "visible", "blocked", "distance_maps")
+
+    def __init__(self, engine: Engine):
+        game_map = engine.game_map
+        self.player_xy: Tuple[int, int] = (engine.player.x, engine.player.y)
+        self.visible: np.ndarray = game_map.visible.copy()
+        self.visible.flags.writeable = False
+        data = game_map.actor_store.data
+        data = data[data["alive"]]
+        self.blocked: FrozenSet[Tuple[int, int]] = frozenset(
+            zip(data["x"].tolist(), data["y"].tolist())
+        )
+        self.distance_maps: DistanceMaps = game_map.distance_maps
+
+
 class BaseAI(Action):
+    def plan(self, snapshot: AISnapshot) -> Optional[List[Action]]:
+        """
+        Return the actions this AI would like to take, the most wanted first.
+
+        Planning only reads the snapshot and the tiles, apart from the AIs own
+        memory, so that plans can be made in parallel.  Returning None leaves the
+        whole turn to `perform`, which happens in turn order.
+        """
+        return None
+
+    def resolve(self, actions: List[Action]) -> None:
+        """Perform the first of `actions` which is still possible.
+
+        An action can have become impossible since it was planned, for example
+        when another enemy has moved into the same tile first.
+        """
+        for action in actions:
+            try:
+                return action.perform()
+            except exceptions.Impossible:
+                continue
+        return WaitAction(self.entity).perform()
+
     def perform(self) -> None:
-        raise NotImplementedError()
+        actions = self.plan(AISnapshot(self.engine))
+        if actions is None:
+            raise NotImplementedError()
+        self.resolve(actions)
 
     def get_path_to(self, dest_x: int, dest_y: int) -> List[Tuple[int, int]]:
         """Compute and return a path to the target position.
 
+        The search is first limited to a box around both positions, so that large
+        maps don't make every path as expensive as the whole map.
+
         If there is no valid path then returns an empty list.
         """
-        # Copy the walkable array.
-        cost = np.array(self.entity.gamemap.tiles["walkable"], dtype=np.int8)
+        gamemap = self.entity.gamemap
+        x, y = self.entity.x, self.entity.y
+
+        left = max(0, min(x, dest_x) - PATH_MARGIN)
+        top = max(0, min(y, dest_y) - PATH_MARGIN)
+        right = min(gamemap.width, max(x, dest_x) + PATH_MARGIN + 1)
+        bottom = min(gamemap.height, max(y, dest_y) + PATH_MARGIN + 1)
+
+        path = self.get_path_in_area(dest_x, dest_y, left, top, right, bottom)
+        if not path and (right - left, bottom - top) != (gamemap.width, gamemap.height):
+            # The only way there might leave the box, so try the whole map.
+            path = self.get_path_in_area(
+                dest_x, dest_y, 0, 0, gamemap.width, gamemap.height
+            )
+        return path
+
+    def get_path_in_area(
+        self, dest_x: int, dest_y: int, left: int, top: int, right: int, bottom: int
+    ) -> List[Tuple[int, int]]:
+        """Compute a path to the target position which stays inside the given box."""
+        gamemap = self.entity.gamemap
 
-        for entity in self.entity.gamemap.entities:
-            # Check that an enitiy blocks movement and the cost isn't zero (blocking.)
-            if entity.blocks_movement and cost[entity.x, entity.y]:
-                # Add to the cost of a blocked position.
-                # A lower number means more enemies will crowd behind each other in
-                # hallways.  A higher number means enemies will take longer paths in
-                # order to surround the player.
-                cost[entity.x, entity.y] += 10
+        # Copy the walkable array.
+        cost = np.array(
+            gamemap.tiles["walkable"][left:right, top:bottom], dtype=np.int8
+        )
+
+        # Living actors are the only entities which block movement.
+        data = gamemap.actor_store.data
+        data = data[
+            data["alive"]
+            & (data["x"] >= left)
+            & (data["x"] < right)
+            & (data["y"] >= top)
+            & (data["y"] < bottom)
+        ]
+        xs = data["x"] - left
+        ys = data["y"] - top
+        blocked = cost[xs, ys] != 0
+        # Add to the cost of a blocked position.
+        # A lower number means more enemies will crowd behind each other in
+        # hallways.  A higher number means enemies will take longer paths in
+        # order to surround the player.
+        np.add.at(cost, (xs[blocked], ys[blocked]), 10)
 
         # Create a graph from the cost array and pass that graph to a new pathfinder.
         graph = tcod.path.SimpleGraph(cost=cost, cardinal=2, diagonal=3)
         pathfinder = tcod.path.Pathfinder(graph)
 
-        pathfinder.add_root((self.entity.x, self.entity.y))  # Start position.
+        # Start position.
+        pathfinder.add_root((self.entity.x - left, self.entity.y - top))
 
         # Compute the path to the destination and remove the starting point.
-        path: List[List[int]] = pathfinder.path_to((dest_x, dest_y))[1:].tolist()
+        path: List[List[int]] = pathfinder.path_to((dest_x - left, dest_y - top))[
+            1:
+        ].tolist()
 
-        # Convert from List[List[int]] to List[Tuple[int, int]].
-        return [(index[0], index[1]) for index in path]
+        # Convert back to map positions as a List[Tuple[int, int]].
+        return [(index[0] + left, index[1] + top) for index in path]
 
 
 class HostileEnemy(BaseAI):
+    """
+    Chases the player while in view, and afterwards heads to where the player was
+    last seen.
+
+    Every enemy chasing the same position shares one distance map from the maps
+    DistanceMaps, so each enemy only has to look at its neighbors to take a step.
+    All the steps towards the target are planned, so that an enemy whose best step
+    was taken by another enemy can still take the next best one.
+    """
+
     def __init__(self, entity: Actor):
         super().__init__(entity)
-        self.path: List[Tuple[int, int]] = []
+        self.target: Optional[Tuple[int, int]] = None
 
-    def perform(self) -> None:
-        target = self.engine.player
-        dx = target.x - self.entity.x
-        dy = target.y - self.entity.y
+    def plan(self, snapshot: AISnapshot) -> List[Action]:
+        x, y = self.entity.x, self.entity.y
+        target_x, target_y = snapshot.player_xy
+        dx = target_x - x
+        dy = target_y - y
         distance = max(abs(dx), abs(dy))  # Chebyshev distance.
 
-        if self.engine.game_map.visible[self.entity.x, self.entity.y]:
+        if snapshot.visible[x, y]:
             if distance <= 1:
-                return MeleeAction(self.entity, dx, dy).perform()
+                return [MeleeAction(self.entity, dx, dy)]
 
-            self.path = self.get_path_to(target.x, target.y)
+            self.target = target_x, target_y
 
-        if self.path:
-            dest_x, dest_y = self.path.pop(0)
-            return MovementAction(
-                self.entity,
-                dest_x - self.entity.x,
-                dest_y - self.entity.y,
-            ).perform()
+        if self.target == (x, y):
+            self.target = None
+        if not self.target:
+            return []
 
-        return WaitAction(self.entity).perform()
+        distances = snapshot.distance_maps.get([self.target], radius=CHASE_RADIUS)
+        return [
+            MovementAction(self.entity, dest_x - x, dest_y - y)
+            for dest_x, dest_y in distances.downhill(x, y)
+            if (dest_x, dest_y) not in snapshot.blocked
+        ]
 
 
 class ConfusedEnemy(BaseAI):
@@ -97,18 +210,19 @@ class ConfusedEnemy(BaseAI):
             self.entity.ai = self.previous_ai
         else:
             # Pick a random direction
-            direction_x, direction_y = random.choice(
-                [
-                    (-1, -1),  # Northwest
-                    (0, -1),  # North
-                    (1, -1),  # Northeast
-                    (-1, 0),  # West
-                    (1, 0),  # East
-                    (-1, 1),  # Southwest
-                    (0, 1),  # South
-                    (1, 1),  # Southeast
-                ]
-            )
+            directions = [
+                (-1, -1),  # Northwest
+                (0, -1),  # North
+                (1, -1),  # Northeast
+                (-1, 0),  # West
+                (1, 0),  # East
+                (-1, 1),  # Southwest
+                (0, 1),  # South
+                (1, 1),  # Southeast
+            ]
+            direction_x, direction_y = directions[
+                self.engine.rng_streams.ai.integers(len(directions))
+            ]
 
             self.turns_remaining -= 1
 
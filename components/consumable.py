@@ -19,6 +19,8 @@ if TYPE_CHECKING:
 
 
 class Consumable(BaseComponent):
+    __slots__ = ()
+
     parent: Item
 
     def get_action(self, consumer: Actor) -> Optional[ActionOrHandler]:
@@ -41,6 +43,8 @@ class Consumable(BaseComponent):
 
 
 class ConfusionConsumable(Consumable):
+    __slots__ = ("number_of_turns",)
+
     def __init__(self, number_of_turns: int):
         self.number_of_turns = number_of_turns
 
@@ -77,6 +81,8 @@ class ConfusionConsumable(Consumable):
 
 
 class HealingConsumable(Consumable):
+    __slots__ = ("amount",)
+
     def __init__(self, amount: int):
         self.amount = amount
 
@@ -95,6 +101,8 @@ class HealingConsumable(Consumable):
 
 
 class FireballDamageConsumable(Consumable):
+    __slots__ = ("damage", "radius")
+
     def __init__(self, damage: int, radius: int):
         self.damage = damage
         self.radius = radius
@@ -108,44 +116,44 @@ class FireballDamageConsumable(Consumable):
             radius=self.radius,
             callback=lambda xy: actions.ItemAction(consumer, self.parent, xy),
         )
-        
+
     def activate(self, action: actions.ItemAction) -> None:
         target_xy = action.target_xy
 
         if not self.engine.game_map.visible[target_xy]:
             raise Impossible("You cannot target an area that you cannot see.")
 
-        targets_hit = False
-        for actor in self.engine.game_map.actors:
-            if actor.distance(*target_xy) <= self.radius:
-                self.engine.message_log.add_message(
-                    f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!"
-                )
-                actor.fighter.take_damage(self.damage)
-                targets_hit = True
+        targets = self.engine.game_map.actors_in_radius(*target_xy, self.radius)
+        for actor in targets:
+            self.engine.message_log.add_message(
+                f"The {actor.name} is engulfed in a fiery explosion, taking {self.damage} damage!"
+            )
+            actor.fighter.take_damage(self.damage)
 
-        if not targets_hit:
+        if not targets:
             raise Impossible("There are no targets in the radius.")
         self.consume()
 
 
 class LightningDamageConsumable(Consumable):
+    __slots__ = ("damage", "maximum_range")
+
     def __init__(self, damage: int, maximum_range: int):
         self.damage = damage
         self.maximum_range = maximum_range
 
     def activate(self, action: actions.ItemAction) -> None:
         consumer = action.entity
-        target = None
-        closest_distance = self.maximum_range + 1.0
+        game_map = self.engine.game_map
 
-        for actor in self.engine.game_map.actors:
-            if actor is not consumer and self.parent.gamemap.visible[actor.x, actor.y]:
-                distance = consumer.distance(actor.x, actor.y)
-
-                if distance < closest_distance:
-                    target = actor
-                    closest_distance = distance
+        target = game_map.nearest_actor(
+            consumer.x,
+            consumer.y,
+            self.maximum_range + 1.0,
+            lambda actor: actor is not consumer and game_map.visible[actor.x, actor.y],
+        )
+        if target and consumer.distance(target.x, target.y) >= self.maximum_range + 1.0:
+            target = None
 
         if target:
             self.engine.message_log.add_message(
@@ -11,6 +11,8 @@ if TYPE_CHECKING:
 
 
 class Equippable(BaseComponent):
+    __slots__ = ("equipment_type", "power_bonus", "defense_bonus")
+
     parent: Item
 
     def __init__(
@@ -26,20 +28,28 @@ class Equippable(BaseComponent):
 
 
 class Dagger(Equippable):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__(equipment_type=EquipmentType.WEAPON, power_bonus=2)
 
 
 class Sword(Equippable):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__(equipment_type=EquipmentType.WEAPON, power_bonus=4)
 
 
 class LeatherArmor(Equippable):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__(equipment_type=EquipmentType.ARMOR, defense_bonus=1)
 
 
 class ChainMail(Equippable):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__(equipment_type=EquipmentType.ARMOR, defense_bonus=3)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING
 
 import color
 from components.base_component import BaseComponent
@@ -11,6 +11,8 @@ if TYPE_CHECKING:
 
 
 class Fighter(BaseComponent):
+    __slots__ = ("max_hp", "_hp", "base_defense", "base_power", "_defense", "_power")
+
     parent: Actor
 
     def __init__(self, hp: int, base_defense: int, base_power: int):
@@ -18,6 +20,9 @@ class Fighter(BaseComponent):
         self._hp = hp
         self.base_defense = base_defense
         self.base_power = base_power
+        # Cached totals of the base stats and equipment bonuses.
+        self._defense: Optional[int] = None
+        self._power: Optional[int] = None
 
     @property
     def hp(self) -> int:
@@ -25,11 +30,23 @@ class Fighter(BaseComponent):
 
     @property
     def defense(self) -> int:
-        return self.base_defense + self.defense_bonus
+        if self._defense is None:
+            self._defense = self.base_defense + self.defense_bonus
+        return self._defense
 
     @property
     def power(self) -> int:
-        return self.base_power + self.power_bonus
+        if self._power is None:
+            self._power = self.base_power + self.power_bonus
+        return self._power
+
+    def invalidate_stats(self) -> None:
+        """Recalculate defense and power the next time they are read.
+
+        Must be called whenever the base stats or the equipped items change.
+        """
+        self._defense = None
+        self._power = None
 
     @property
     def defense_bonus(self) -> int:
@@ -50,6 +67,7 @@ class Fighter(BaseComponent):
         self._hp = max(0, min(value, self.max_hp))
         if self._hp == 0 and self.parent.ai:
             self.die()
+        self.parent.update_store()
 
     def die(self) -> None:
         if self.engine.player is self.parent:
@@ -65,6 +83,7 @@ class Fighter(BaseComponent):
         self.parent.ai = None
         self.parent.name = f"remains of {self.parent.name}"
         self.parent.render_order = RenderOrder.CORPSE
+        self.gamemap.actor_died(self.parent)
 
         self.engine.message_log.add_message(death_message, death_message_color)
 
@@ -9,6 +9,14 @@ if TYPE_CHECKING:
 
 
 class Level(BaseComponent):
+    __slots__ = (
+        "current_level",
+        "current_xp",
+        "level_up_base",
+        "level_up_factor",
+        "xp_given",
+    )
+
     parent: Actor
 
     def __init__(
@@ -61,6 +69,8 @@ class Level(BaseComponent):
 
     def increase_power(self, amount: int = 1) -> None:
         self.parent.fighter.base_power += amount
+        self.parent.fighter.invalidate_stats()
+        self.parent.update_store()
 
         self.engine.message_log.add_message("You feel stronger!")
 
@@ -68,6 +78,8 @@ class Level(BaseComponent):
 
     def increase_defense(self, amount: int = 1) -> None:
         self.parent.fighter.base_defense += amount
+        self.parent.fighter.invalidate_stats()
+        self.parent.update_store()
 
         self.engine.message_log.add_message("Your movements are getting swifter!")
 
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import threading
+from typing import Iterable, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import numpy as np  # type: ignore
+import tcod
+
+if TYPE_CHECKING:
+    from game_map import GameMap
+
+# Step costs, the same as the ones used for pathfinding.
+CARDINAL_COST = 2
+DIAGONAL_COST = 3
+
+# How much further away than the goals a flee map prefers, see `DistanceMaps.flee`.
+FLEE_COEFFICIENT = -1.2
+
+_NEIGHBORS = ((-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+Goals = Tuple[Tuple[int, int], ...]
+
+
+class DistanceMap:
+    """
+    The distance of every cell in an area of the map to the nearest goal.
+
+    `left` and `top` are the map position of the first cell of `distances`.  Cells
+    which can't reach a goal hold `unreachable`.
+    """
+
+    __slots__ = ("distances", "left", "top", "unreachable")
+
+    def __init__(self, distances: np.ndarray, left: int, top: int, unreachable):
+        self.distances = distances
+        self.distances.flags.writeable = False  # Shared by everyone who asks.
+        self.left = left
+        self.top = top
+        self.unreachable = unreachable
+
+    def at(self, x: int, y: int) -> Optional[float]:
+        """Return the distance at the map position (x, y), or None if unreachable."""
+        i, j = x - self.left, y - self.top
+        width, height = self.distances.shape
+        if not (0 <= i < width and 0 <= j < height):
+            return None
+        distance = self.distances[i, j]
+        if distance == self.unreachable:
+            return None
+        return distance
+
+    def downhill(self, x: int, y: int) -> List[Tuple[int, int]]:
+        """Return the neighbors of (x, y) which are closer to a goal, closest first."""
+        here = self.at(x, y)
+        if here is None:
+            return []
+        steps = []
+        for dx, dy in _NEIGHBORS:
+            distance = self.at(x + dx, y + dy)
+            if distance is not None and distance < here:
+                steps.append((distance, x + dx, y + dy))
+        steps.sort()
+        return [(step_x, step_y) for _, step_x, step_y in steps]
+
+
+class DistanceMaps:
+    """
+    Dijkstra distance maps of a GameMap, kept so that they are only computed once.
+
+    Maps are cached by their goals and their area.  The least recently used ones
+    are dropped once there are more than `capacity` maps, or they take more than
+    `max_bytes`.  Every map is dropped once the maps walkable version has moved
+    on, or `invalidate` is called.  Maps are stored as uint16 when their
+    distances fit, and int32 otherwise.
+
+    Maps can be asked for from several threads at once.  Two threads asking for
+    the same missing map may both compute it, but they get equal maps.
+    """
+
+    def __init__(
+        self, game_map: GameMap, capacity: int = 32, max_bytes: int = 64 * 2**20
+    ):
+        self.game_map = game_map
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.version = 0
+        self._walkable_version = game_map.changes.walkable
+        self._cache: OrderedDict[tuple, DistanceMap] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        """Leave the cached maps out of saves, they are rebuilt when needed."""
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+        state["nbytes"] = 0
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def invalidate(self) -> None:
+        """Forget every map, after a change the walkable version doesn't cover."""
+        with self._lock:
+            self.version += 1
+            self._cache.clear()
+            self.nbytes = 0
+
+    def _forget_stale(self) -> None:
+        """Drop every map if the walkable tiles have changed, with the lock held."""
+        walkable_version = self.game_map.changes.walkable
+        if walkable_version != self._walkable_version:
+            self._walkable_version = walkable_version
+            self.version += 1
+            self._cache.clear()
+            self.nbytes = 0
+
+    def _key(self, *parts: object) -> tuple:
+        """Return the cache key of a map, after dropping stale maps."""
+        with self._lock:
+            self._forget_stale()
+            return (*parts, self.version)
+
+    def _cached(self, key: tuple) -> Optional[DistanceMap]:
+        with self._lock:
+            distance_map = self._cache.get(key)
+            if distance_map is not None:
+                self._cache.move_to_end(key)
+            return distance_map
+
+    def _store(self, key: tuple, distance_map: DistanceMap) -> DistanceMap:
+        with self._lock:
+            if key in self._cache:
+                # Another thread computed the same map first.
+                return self._cache[key]
+            self._cache[key] = distance_map
+            self.nbytes += distance_map.distances.nbytes
+            # The newest map is always kept, even if it alone is over the limit.
+            while len(self._cache) > 1 and (
+                len(self._cache) > self.capacity or self.nbytes > self.max_bytes
+            ):
+                _, evicted = self._cache.popitem(last=False)
+                self.nbytes -= evicted.distances.nbytes
+            return distance_map
+
+    def _area(self, goals: Goals, radius: Optional[int]) -> Tuple[int, int, int, int]:
+        """Return the left, top, right and bottom of the area a map covers."""
+        game_map = self.game_map
+        if radius is None:
+            return 0, 0, game_map.width, game_map.height
+        xs = [x for x, _ in goals]
+        ys = [y for _, y in goals]
+        return (
+            max(0, min(xs) - radius),
+            max(0, min(ys) - radius),
+            min(game_map.width, max(xs) + radius + 1),
+            min(game_map.height, max(ys) + radius + 1),
+        )
+
+    def _scan(
+        self, dist: np.ndarray, left: int, top: int, right: int, bottom: int
+    ) -> np.ndarray:
+        cost = self.game_map.tiles["walkable"][left:right, top:bottom].astype(np.int8)
+        tcod.path.dijkstra2d(dist, cost, CARDINAL_COST, DIAGONAL_COST, out=dist)
+        return dist
+
+    def get(
+        self, goals: Iterable[Tuple[int, int]], radius: Optional[int] = None
+    ) -> DistanceMap:
+        """
+        Return the distance map to the nearest of `goals`.  Goals which can't be
+        walked on are left out.
+
+        With a `radius` only the box that far around the goals is covered, which
+        keeps maps for nearby goals cheap on large maps.
+        """
+        goal_key: Goals = tuple(sorted(set(goals)))
+        key = self._key("distance", goal_key, radius)
+        distance_map = self._cached(key)
+        if distance_map is not None:
+            return distance_map
+
+        left, top, right, bottom = self._area(goal_key, radius)
+        dist = tcod.path.maxarray((right - left, bottom - top), dtype=np.int32)
+        walkable = self.game_map.tiles["walkable"]
+        for x, y in goal_key:
+            if walkable[x, y]:
+                dist[x - left, y - top] = 0
+        dist = self._scan(dist, left, top, right, bottom)
+
+        unreachable = np.iinfo(np.int32).max
+        if dist[dist != unreachable].max(initial=0) < np.iinfo(np.uint16).max:
+            dist = np.where(dist == unreachable, np.iinfo(np.uint16).max, dist).astype(
+                np.uint16
+            )
+            unreachable = np.iinfo(np.uint16).max
+        return self._store(key, DistanceMap(dist, left, top, unreachable))
+
+    def flee(
+        self,
+        goals: Iterable[Tuple[int, int]],
+        coefficient: float = FLEE_COEFFICIENT,
+    ) -> DistanceMap:
+        """
+        Return a map for getting away from `goals`.
+
+        The distances to the goals are scaled by a negative `coefficient` and then
+        scanned again, so going downhill leads away from the goals, but towards
+        open space instead of into the nearest dead end.
+        """
+        goal_key: Goals = tuple(sorted(set(goals)))
+        key = self._key("flee", goal_key, coefficient)
+        distance_map = self._cached(key)
+        if distance_map is not None:
+            return distance_map
+
+        towards = self.get(goal_key)
+        reachable = towards.distances != towards.unreachable
+        unreachable = np.iinfo(np.int32).max
+        dist = np.where(
+            reachable,
+            np.round(towards.distances * coefficient),
+            unreachable,
+        ).astype(np.int32)
+        dist = self._scan(dist, 0, 0, self.game_map.width, self.game_map.height)
+        return self._store(key, DistanceMap(dist, 0, 0, unreachable))
+
+    def desire(
+        self, weighted_goals: Sequence[Tuple[float, Iterable[Tuple[int, int]]]]
+    ) -> DistanceMap:
+        """
+        Return the weighted sum of the distance maps of several sets of goals.
+
+        A positive weight makes its goals attractive and a negative one repels.
+        Cells which can't reach all of the goals are unreachable.
+        """
+        parts = [
+            (float(weight), tuple(sorted(set(goals))))
+            for weight, goals in weighted_goals
+        ]
+        key = self._key("desire", tuple(parts))
+        distance_map = self._cached(key)
+        if distance_map is not None:
+            return distance_map
+
+        total = np.zeros((self.game_map.width, self.game_map.height), np.float32)
+        reachable = np.ones(total.shape, dtype=bool)
+        for weight, goals in parts:
+            distances = self.get(goals)
+            reachable &= distances.distances != distances.unreachable
+            total += weight * distances.distances
+        total[~reachable] = np.inf
+        return self._store(key, DistanceMap(total, 0, 0, np.inf))
@@ -1,74 +1,196 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 import lzma
+import os
 import pickle
-from typing import TYPE_CHECKING
+import threading
+from typing import Optional, TYPE_CHECKING
 
 from tcod.context import Context
 from tcod.console import Console
 from tcod.map import compute_fov
-from numpy import random
 
+from camera import Camera
+from components.ai import AISnapshot
 import exceptions
 from message_log import MessageLog
+from profiling import TurnProfiler
+from random_streams import RandomStreams
 import render_functions
 
 if TYPE_CHECKING:
     from entity import Actor
     from game_map import GameMap, GameWorld
+    from recording import InputRecorder
+
+
+# How far the player can see.
+FOV_RADIUS = 8
+
+# The file the game is saved to and continued from.
+SAVE_FILENAME = "savegame.sav"
+
+# Held while a save is written on a worker thread, and while a save is deleted.
+save_lock = threading.Lock()
 
 
 class Engine:
     game_map: GameMap
     game_world: GameWorld
 
-    def __init__(self, player: Actor, seed=None):
+    def __init__(self, player: Actor, seed=None, ai_workers: int = 0):
         self.message_log = MessageLog()
+        # The map position under the mouse or targeting cursor.
         self.mouse_location = (0, 0)
+        # The screen area above the message log which shows the map.
+        self.camera = Camera(width=80, height=43)
         self.player = player
         self.seed = seed
-        self.rng = random.default_rng(seed=seed)
+        self.rng_streams = RandomStreams(seed)
+        self.profiler = TurnProfiler()
+        # Told about every action which takes a turn, while recording a session.
+        self.recorder: Optional[InputRecorder] = None
+        # Threads enemy turns are planned on, planning happens on this thread if 0.
+        self.ai_workers = ai_workers
+        self._ai_pool: Optional[ThreadPoolExecutor] = None
+
+    def __getstate__(self) -> dict:
+        """Leave out the recorder, which writes to an open file, and the threads."""
+        state = self.__dict__.copy()
+        state["recorder"] = None
+        state["_ai_pool"] = None
+        return state
 
     def handle_enemy_turns(self) -> None:
-        for entity in set(self.game_map.actors) - {self.player}:
-            if entity.ai:
-                try:
-                    entity.ai.perform()
-                except exceptions.Impossible:
-                    pass  # Ignore impossible action exceptions from AI.
+        """
+        Let every enemy take its turn.
+
+        All the enemies first plan from the same snapshot of the floor, on
+        `ai_workers` threads if there are any.  The plans are then resolved one
+        enemy at a time.  Both happen in order of position, so that turn order
+        doesn't depend on set ordering, or on how threads are scheduled, which
+        would make seeded games play out differently between runs.
+        """
+        store = self.game_map.actor_store
+        enemies = [
+            store.actors[i]
+            for i in store.living_indexes()
+            if store.actors[i] is not self.player and store.actors[i].ai
+        ]
+        if not enemies:
+            return
+
+        snapshot = AISnapshot(self)
+        planners = [entity.ai for entity in enemies]
+        if self.ai_workers and len(enemies) > 1:
+            if self._ai_pool is None:
+                self._ai_pool = ThreadPoolExecutor(self.ai_workers)
+            # One chunk of enemies per thread, since a single plan is too little
+            # work to be worth handing to another thread.
+            chunks = [planners[i :: self.ai_workers] for i in range(self.ai_workers)]
+            chunk_plans = list(
+                self._ai_pool.map(
+                    lambda chunk: [ai.plan(snapshot) for ai in chunk], chunks
+                )
+            )
+            plans = [None] * len(planners)
+            for i, chunk in enumerate(chunk_plans):
+                plans[i :: self.ai_workers] = chunk
+        else:
+            plans = [ai.plan(snapshot) for ai in planners]
+
+        for entity, ai, actions in zip(enemies, planners, plans):
+            if not entity.is_alive or entity.ai is not ai:
+                continue  # Killed, or its AI replaced, since planning.
+            try:
+                if actions is None:
+                    ai.perform()
+                else:
+                    ai.resolve(actions)
+            except exceptions.Impossible:
+                pass  # Ignore impossible action exceptions from AI.
 
     def update_fov(self) -> None:
-        """Recompute the visible area"""
-        self.game_map.visible[:] = compute_fov(
-            self.game_map.tiles["transparent"], (self.player.x, self.player.y), radius=8
+        """Recompute the visible area.
+
+        Only the square around the player which the view radius can reach is
+        computed, so this doesn't get slower as maps get larger.  Nothing is
+        computed if the player hasn't moved and no tile has changed transparency.
+        """
+        game_map = self.game_map
+        x, y = self.player.x, self.player.y
+        visible_from = (x, y, game_map.changes.transparent)
+        if game_map.visible_from == visible_from:
+            return
+        game_map.visible_from = visible_from
+
+        game_map.visible[game_map.visible_area] = False
+
+        area = (
+            slice(max(0, x - FOV_RADIUS), x + FOV_RADIUS + 1),
+            slice(max(0, y - FOV_RADIUS), y + FOV_RADIUS + 1),
         )
+        game_map.visible[area] = compute_fov(
+            game_map.tiles["transparent"][area],
+            (x - area[0].start, y - area[1].start),
+            radius=FOV_RADIUS,
+        )
+        game_map.visible_area = area
 
-        self.game_map.explored |= self.game_map.visible
+        game_map.explored[area] |= game_map.visible[area]
 
     def render(self, console: Console) -> None:
-        self.game_map.render(console)
+        with self.profiler.phase("render"):
+            self.camera.center_on(
+                self.player.x, self.player.y, self.game_map.width, self.game_map.height
+            )
+            self.game_map.render(console, self.camera)
+
+            self.message_log.render(console=console, x=21, y=45, width=40, height=5)
+
+            render_functions.render_bar(
+                console=console,
+                current_value=self.player.fighter.hp,
+                maximum_value=self.player.fighter.max_hp,
+                total_width=20,
+            )
+
+            render_functions.render_dungeon_level(
+                console=console,
+                dungeon_level=self.game_world.current_floor,
+                location=(0, 47),
+            )
+
+            render_functions.render_names_at_mouse_location(
+                console=console, x=21, y=44, engine=self
+            )
+
+        if self.profiler.enabled:
+            render_functions.render_perf_overlay(console, self.profiler)
 
-        self.message_log.render(console=console, x=21, y=45, width=40, height=5)
+    def save_as(self, filename: str) -> None:
+        """Save this Engine instance as a compressed file."""
+        write_save(filename, pickle.dumps(self))
 
-        render_functions.render_bar(
-            console=console,
-            current_value=self.player.fighter.hp,
-            maximum_value=self.player.fighter.max_hp,
-            total_width=20,
-        )
 
-        render_functions.render_dungeon_level(
-            console=console,
-            dungeon_level=self.game_world.current_floor,
-            location=(0, 47),
-        )
+def write_save(filename: str, pickled: bytes) -> None:
+    """Compress a pickled Engine and write it to `filename`.
 
-        render_functions.render_names_at_mouse_location(
-            console=console, x=21, y=44, engine=self
-        )
+    The file is written next to `filename` first and then moved over it, so an
+    existing save is never left half written.  This doesn't touch the engine, so
+    it can run on another thread while the game goes on.
+    """
+    temporary = f"{filename}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(lzma.compress(pickled))
+    os.replace(temporary, filename)
 
-    def save_as(self, filename: str) -> None:
-        """Save this Engine instance as a compressed file."""
-        save_data = lzma.compress(pickle.dumps(self))
-        with open(filename, "wb") as f:
-            f.write(save_data)
+
+def delete_save(filename: str) -> None:
+    """Delete the save `filename` if there is one, once any save being written
+    on a worker thread has finished.
+    """
+    with save_lock:
+        if os.path.exists(filename):
+            os.remove(filename)
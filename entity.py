@@ -24,6 +24,17 @@ class Entity:
     A generic object to represent players, enemies, items, etc.
     """
 
+    __slots__ = (
+        "parent",
+        "x",
+        "y",
+        "char",
+        "color",
+        "name",
+        "blocks_movement",
+        "render_order",
+    )
+
     parent: Union[GameMap, Inventory]
 
     def __init__(
@@ -47,7 +58,7 @@ class Entity:
         if parent:
             # If parent isn't provided now then it will be set later.
             self.parent = parent
-            parent.entities.add(self)
+            parent.add_entity(self)
 
     @property
     def gamemap(self) -> GameMap:
@@ -59,19 +70,25 @@ class Entity:
         clone.x = x
         clone.y = y
         clone.parent = gamemap
-        gamemap.entities.add(clone)
+        gamemap.add_entity(clone)
         return clone
 
     def place(self, x: int, y: int, gamemap: Optional[GameMap] = None) -> None:
         """Place this entity at a new location.  Handles moving across GameMaps."""
-        self.x = x
-        self.y = y
         if gamemap:
             if hasattr(self, "parent"):  # Possibly uninitialized.
                 if self.parent is self.gamemap:
-                    self.gamemap.entities.remove(self)
+                    self.gamemap.remove_entity(self)
+            self.x = x
+            self.y = y
             self.parent = gamemap
-            gamemap.entities.add(self)
+            gamemap.add_entity(self)
+        else:
+            from_x, from_y = self.x, self.y
+            self.x = x
+            self.y = y
+            if hasattr(self, "parent") and self.parent is self.gamemap:
+                self.gamemap.entity_moved(self, from_x, from_y)
 
     def distance(self, x: int, y: int) -> float:
         """
@@ -83,9 +100,12 @@ class Entity:
         # Move the entity
         self.x += dx
         self.y += dy
+        self.gamemap.entity_moved(self, self.x - dx, self.y - dy)
 
 
 class Actor(Entity):
+    __slots__ = ("ai", "fighter", "equipment", "inventory", "level")
+
     def __init__(
         self,
         *,
@@ -129,8 +149,15 @@ class Actor(Entity):
         """Returns True as long as this actor can perform actions."""
         return bool(self.ai)
 
+    def update_store(self) -> None:
+        """Copy this actors stats into the actor store of its map."""
+        if hasattr(self, "parent"):  # Possibly not placed yet.
+            self.gamemap.actor_store.update(self)
+
 
 class Item(Entity):
+    __slots__ = ("consumable", "equippable")
+
     def __init__(
         self,
         *,
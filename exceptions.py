@@ -5,5 +5,9 @@ class Impossible(Exception):
     """
 
 
+class BuildTimeout(Exception):
+    """Raised by a map builder which has used up its step budget."""
+
+
 class QuitWithoutSaving(SystemExit):
     """Can be raised to exit the game without automatically saving."""
@@ -0,0 +1,197 @@
+"""Packs of prebuilt floors, which can be loaded instead of building floors live.
+
+A pack is an uncompressed `.npz` archive.  The tiles of every floor are stored as
+one (floors, width, height) array of tile ids, which is memory mapped straight
+out of the archive, so loading a floor only reads that floor from disk.  The
+index arrays give the seed, floor number and builder of each packed floor, and
+the entities of each floor are stored as template ids and positions.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+import zipfile
+
+import numpy as np  # type: ignore
+
+import entity_factories
+from entity import Entity
+from game_map import GameMap
+import tile_types
+
+if TYPE_CHECKING:
+    from engine import Engine
+
+# Tile types in the order of their ids in a pack.  New types must be added at
+# the end, so that existing packs keep their meaning.
+TILE_PALETTE = np.stack(
+    [tile_types.wall, tile_types.floor, tile_types.down_stairs, tile_types.center]
+)
+
+# Entity templates which can be spawned on a floor, by the name of the spawned
+# entity, and in the order of their ids in a pack.
+TEMPLATES: Dict[str, Entity] = {
+    template.name: template
+    for template in vars(entity_factories).values()
+    if isinstance(template, Entity) and template is not entity_factories.player
+}
+TEMPLATE_NAMES = sorted(TEMPLATES)
+
+
+def encode_tiles(tiles: np.ndarray) -> np.ndarray:
+    """Return the palette id of every tile in `tiles`."""
+    ids = np.full(tiles.shape, 255, dtype=np.uint8)
+    for tile_id, tile in enumerate(TILE_PALETTE):
+        ids[tiles == tile] = tile_id
+    if (ids == 255).any():
+        raise ValueError("Tiles contain a tile type which isn't in TILE_PALETTE.")
+    return ids
+
+
+def encode_floor(dungeon: GameMap) -> Dict[str, np.ndarray]:
+    """Return the arrays which store a built floor in a pack."""
+    player = dungeon.engine.player
+    entities = [entity for entity in dungeon.entities if entity is not player]
+    entities.sort(key=lambda entity: (entity.x, entity.y, entity.name))
+    return {
+        "tiles": encode_tiles(dungeon.tiles),
+        "player_xy": np.array([player.x, player.y], dtype=np.int32),
+        "downstairs": np.array(dungeon.downstairs, dtype=np.int32),
+        "entity_template": np.array(
+            [TEMPLATE_NAMES.index(entity.name) for entity in entities],
+            dtype=np.int16,
+        ),
+        "entity_xy": np.array(
+            [(entity.x, entity.y) for entity in entities], dtype=np.int32
+        ).reshape(-1, 2),
+    }
+
+
+def write_pack(
+    filename: str,
+    seeds: Sequence[int],
+    floor_numbers: Sequence[int],
+    builders: Sequence[str],
+    floors: Sequence[Dict[str, np.ndarray]],
+) -> None:
+    """Write encoded floors to `filename`, with one seed, floor number and
+    builder name for each floor.
+    """
+    entity_counts = [len(floor["entity_template"]) for floor in floors]
+    np.savez(
+        filename,
+        seed=np.array(seeds, dtype=np.int64),
+        floor=np.array(floor_numbers, dtype=np.int32),
+        builder=np.array(builders),
+        tiles=np.stack([floor["tiles"] for floor in floors]),
+        player_xy=np.stack([floor["player_xy"] for floor in floors]),
+        downstairs=np.stack([floor["downstairs"] for floor in floors]),
+        entity_offsets=np.concatenate([[0], np.cumsum(entity_counts)]).astype(np.int64),
+        entity_template=np.concatenate(
+            [floor["entity_template"] for floor in floors]
+        ).astype(np.int16),
+        entity_xy=np.concatenate([floor["entity_xy"] for floor in floors]).astype(
+            np.int32
+        ),
+        template_names=np.array(TEMPLATE_NAMES),
+        palette=TILE_PALETTE,
+    )
+
+
+def memmap_npz_member(filename: str, name: str) -> np.ndarray:
+    """Memory map the array `name` out of an uncompressed `.npz` file."""
+    with zipfile.ZipFile(filename) as archive:
+        info = archive.getinfo(f"{name}.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"{name} in {filename} is compressed and can't be mapped.")
+
+    with open(filename, "rb") as f:
+        # The data follows the local file header, whose name and extra field
+        # lengths can differ from the ones in the central directory.
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+        f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+        if np.lib.format.read_magic(f) == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    return np.memmap(
+        filename,
+        dtype=dtype,
+        mode="r",
+        offset=offset,
+        shape=shape,
+        order="F" if fortran_order else "C",
+    )
+
+
+class FloorPack:
+    """A pack of prebuilt floors opened for reading."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._open()
+
+    def _open(self) -> None:
+        with np.load(self.filename) as pack:
+            self.seeds = pack["seed"]
+            self.floors = pack["floor"]
+            self.builders = pack["builder"]
+            self.player_xy = pack["player_xy"]
+            self.downstairs = pack["downstairs"]
+            self.entity_offsets = pack["entity_offsets"]
+            self.entity_template = pack["entity_template"]
+            self.entity_xy = pack["entity_xy"]
+            template_names = [str(name) for name in pack["template_names"]]
+            palette = pack["palette"]
+
+        # Translate the packs ids into the current ids, so older packs still load.
+        self.templates: List[Entity] = [TEMPLATES[name] for name in template_names]
+        self.tile_palette = palette.astype(tile_types.tile_dt)
+
+        self.tiles = memmap_npz_member(self.filename, "tiles")
+        self.index: Dict[Tuple[int, int, str], int] = {}
+        for i, key in enumerate(
+            zip(self.seeds.tolist(), self.floors.tolist(), self.builders.tolist())
+        ):
+            self.index.setdefault(key, i)
+
+    def __getstate__(self) -> dict:
+        """Only save the filename, the pack is opened again when loaded."""
+        return {"filename": self.filename}
+
+    def __setstate__(self, state: dict) -> None:
+        self.filename = state["filename"]
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self.seeds)
+
+    def find(self, seed: Optional[int], floor: int, builder: str) -> Optional[int]:
+        """Return the index of the packed floor for `seed` and `floor` built by the
+        map builder named `builder`, if any.
+        """
+        if seed is None:
+            return None
+        return self.index.get((seed, floor, builder))
+
+    def load_floor(self, index: int, engine: Engine) -> GameMap:
+        """Create the GameMap of a packed floor, with the player placed on it."""
+        ids = np.asarray(self.tiles[index])
+        width, height = ids.shape
+
+        player = engine.player
+        dungeon = GameMap(engine, width, height, entities=[player])
+        dungeon.tiles = np.asfortranarray(self.tile_palette[ids])
+        dungeon.downstairs = tuple(self.downstairs[index].tolist())
+        player.place(*self.player_xy[index].tolist(), dungeon)
+
+        start, end = self.entity_offsets[index], self.entity_offsets[index + 1]
+        for template_id, (x, y) in zip(
+            self.entity_template[start:end].tolist(),
+            self.entity_xy[start:end].tolist(),
+        ):
+            self.templates[template_id].spawn(dungeon, x, y)
+
+        return dungeon
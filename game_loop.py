@@ -0,0 +1,163 @@
+"""The asyncio main loop of the game.
+
+The loop waits for events only briefly, so background coroutines and jobs on
+worker threads get to run between frames even when no key is pressed.  The
+screen is drawn after events, or every frame for handlers which animate, but
+never more often than the frame budget allows.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import pickle
+import time
+import traceback
+from typing import Any, Coroutine, Optional, Set, TYPE_CHECKING
+
+import tcod
+
+import color
+from engine import SAVE_FILENAME, save_lock, write_save
+import input_handlers
+
+if TYPE_CHECKING:
+    from tcod.context import Context
+
+    from entity import Actor
+    from recording import InputRecorder
+
+logger = logging.getLogger(__name__)
+
+# The shortest time between two frames, in seconds.
+FRAME_TIME = 1 / 60
+
+# How long to wait for an event before letting background work run, in seconds.
+EVENT_TIMEOUT = 0.005
+
+# How often the game is saved in the background, in seconds.
+AUTOSAVE_INTERVAL = 60.0
+
+
+class GameLoop:
+    """Runs the active handler, and the background tasks alongside it."""
+
+    def __init__(
+        self,
+        context: Context,
+        console: tcod.Console,
+        handler: input_handlers.BaseEventHandler,
+        recorder: Optional[InputRecorder] = None,
+    ):
+        self.context = context
+        self.console = console
+        self.handler = handler
+        self.recorder = recorder
+        self.tasks: Set[asyncio.Task] = set()
+        self.needs_redraw = True
+        self.last_frame = 0.0
+
+    def spawn(self, coroutine: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """Run `coroutine` in the background until it ends or the loop stops.
+
+        Errors are logged rather than stopping the game.
+        """
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background task failed.", exc_info=task.exception())
+
+    async def run(self) -> None:
+        """Run the game until a handler raises SystemExit or QuitWithoutSaving."""
+        self.spawn(self.autosave(SAVE_FILENAME, AUTOSAVE_INTERVAL))
+        try:
+            while True:
+                self.set_handler(self.handler.update())
+                self.draw()
+                self.handle_events(tcod.event.wait(timeout=EVENT_TIMEOUT))
+                # Let the background tasks run.
+                await asyncio.sleep(0)
+        finally:
+            for task in list(self.tasks):
+                task.cancel()
+
+    def set_handler(self, handler: input_handlers.BaseEventHandler) -> None:
+        if handler is not self.handler:
+            self.handler = handler
+            self.needs_redraw = True
+            if self.recorder:
+                self.recorder.attach(handler)
+
+    def draw(self) -> None:
+        """Draw the active handler, if it needs it and the frame budget allows."""
+        if not (self.needs_redraw or self.handler.redraw_every_frame):
+            return
+        now = time.perf_counter()
+        if now - self.last_frame < FRAME_TIME:
+            return
+        self.last_frame = now
+        self.needs_redraw = False
+
+        self.console.clear()
+        self.handler.on_render(console=self.console)
+        self.context.present(self.console)
+        if self.recorder:
+            self.recorder.record_frame()
+
+    def handle_events(self, events: Any) -> None:
+        try:
+            for event in events:
+                self.context.convert_event(event)
+                self.needs_redraw = True
+                # Handlers waiting on a job ignore input, so it isn't recorded
+                # either, since a replay runs the job before the next event.
+                if self.recorder and not isinstance(
+                    self.handler, input_handlers.ProgressHandler
+                ):
+                    self.recorder.record_event(event)
+                self.set_handler(self.handler.handle_events(event))
+        except Exception:  # Handle exceptions in game.
+            traceback.print_exc()  # Print error to stderr.
+            # Then print the error to the message log.
+            if isinstance(self.handler, input_handlers.EventHandler):
+                self.handler.engine.message_log.add_message(
+                    traceback.format_exc(), color.error
+                )
+
+    async def autosave(self, filename: str, interval: float) -> None:
+        """Save the game in play every `interval` seconds.
+
+        The engine is pickled between turns, and only compressing and writing
+        the file is left to a worker thread.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            handler = self.handler
+            if not isinstance(handler, input_handlers.EventHandler):
+                continue
+            if not handler.engine.player.is_alive:
+                continue  # A finished game isn't saved.
+            pickled = pickle.dumps(handler.engine)
+            saved = await asyncio.get_running_loop().run_in_executor(
+                None, self.write_autosave, filename, pickled, handler.engine.player
+            )
+            if saved:
+                logger.info("Autosaved to %s.", filename)
+
+    @staticmethod
+    def write_autosave(filename: str, pickled: bytes, player: Actor) -> bool:
+        """Write an autosave on a worker thread, unless `player` has died since.
+
+        The save of a finished game is deleted with `delete_save`, which takes the
+        same lock, so an autosave still being written when the player dies can't
+        bring the save back afterwards.  Returns True if the save was written.
+        """
+        with save_lock:
+            if not player.is_alive:
+                return False
+            write_save(filename, pickled)
+            return True
@@ -1,16 +1,86 @@
 from __future__ import annotations
+import copy
+import logging
 import random
-from typing import Iterable, Iterator, Optional, TYPE_CHECKING
+from typing import (
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    KeysView,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+)
 
 import numpy as np  # type: ignore
 from tcod.console import Console
 
+from actor_store import ActorStore
+from distance_maps import DistanceMaps
 from entity import Actor, Item
+import exceptions
+from map_changes import MapChanges
 import tile_types
 
 if TYPE_CHECKING:
+    from camera import Camera
     from engine import Engine
     from entity import Entity
+    from floor_pack import FloorPack
+    from map_builders.map_builder import MapBuilder
+
+logger = logging.getLogger(__name__)
+
+# The builders a floor is randomly chosen from, by class name so that only the one
+# used needs to be imported.
+FLOOR_BUILDERS = (
+    "BSPMapBuilder",
+    "BSPInteriorMapBuilder",
+    "CellularMapBuilder",
+    "EvilCellularMapBuilder",
+    "SimpleMapBuilder",
+    "DrunkenMapBuilder",
+    "MazeMapBuilder",
+)
+
+# A floor build which takes more than this many steps per map cell is abandoned,
+# and the floor is built by FALLBACK_BUILDER instead, which is quick at any size.
+# Steps are counted by the builders, see MapBuilder.report_progress.
+GENERATION_BUDGET = 50
+FALLBACK_BUILDER = "CellularMapBuilder"
+
+# One entity glyph to draw, see `GameMap.render_entities`.
+entity_glyph_dt = np.dtype(
+    [
+        ("x", np.int32),
+        ("y", np.int32),
+        ("ch", np.int32),
+        ("r", np.uint8),
+        ("g", np.uint8),
+        ("b", np.uint8),
+        ("order", np.int8),
+    ]
+)
+
+
+def entity_glyphs(entities: Collection[Entity]) -> np.ndarray:
+    """Return the glyphs of `entities` as an array of entity_glyph_dt."""
+    return np.fromiter(
+        ((e.x, e.y, ord(e.char), *e.color, e.render_order.value) for e in entities),
+        dtype=entity_glyph_dt,
+        count=len(entities),
+    )
+
+
+def topmost_glyphs(glyphs: np.ndarray) -> np.ndarray:
+    """Return the glyphs which are seen, the last one in render order in each cell."""
+    glyphs = glyphs[np.argsort(glyphs["order"], kind="stable")]
+    cells = (glyphs["x"].astype(np.int64) << 32) + glyphs["y"]
+    _, last = np.unique(cells[::-1], return_index=True)
+    return glyphs[len(glyphs) - 1 - last]
 
 
 class GameWorld:
@@ -27,7 +97,10 @@ class GameWorld:
         max_rooms: int,
         room_min_size: int,
         room_max_size: int,
-        current_floor: int = 0
+        current_floor: int = 0,
+        profile_generation: bool = False,
+        floor_pack: Optional[FloorPack] = None,
+        generation_budget: Optional[int] = GENERATION_BUDGET,
     ):
         self.engine = engine
 
@@ -41,30 +114,113 @@ class GameWorld:
 
         self.current_floor = current_floor
 
-    def generate_floor(self) -> None:
-        from map_builders import (
-            BSPMapBuilder,
-            BSPInteriorMapBuilder,
-            CellularMapBuilder,
-            EvilCellularMapBuilder,
-            SimpleMapBuilder,
-            DrunkenMapBuilder,
-            MazeMapBuilder,
-            DLAMapBuilder,
-        )
+        # When enabled, the time taken by each stage of a floor build is recorded
+        # in `stage_timings` under the floor number, and logged at DEBUG level.
+        self.profile_generation = profile_generation
+        self.stage_timings: Dict[int, Dict[str, float]] = {}
 
+        # When set, floors are loaded from this pack of prebuilt floors for the
+        # engines seed, and only built if the pack doesn't have them.
+        self.floor_pack = floor_pack
+
+        # Builds per builder, and how many of them went over the budget and were
+        # replaced by the fallback.  A budget of None lets builds run to the end.
+        self.generation_budget = generation_budget
+        self.build_counts: Dict[str, int] = {}
+        self.budget_overruns: Dict[str, int] = {}
+
+    def generate_floor(
+        self, progress_callback: Optional[Callable[[float], None]] = None
+    ) -> None:
+        """Move on to the next floor, loading it from the floor pack or building it.
+
+        A packed floor is only loaded if it was built by the builder this floor
+        picks, which is how a new game would have built it.  `progress_callback`
+        is called with the fraction of the build done as the build goes on.
+        """
         self.current_floor += 1
+        rng = self.engine.rng_streams.mapgen(self.current_floor)
+        builder_name = str(rng.choice(FLOOR_BUILDERS))
 
-        builders = (
-            BSPMapBuilder,
-            BSPInteriorMapBuilder,
-            CellularMapBuilder,
-            EvilCellularMapBuilder,
-            SimpleMapBuilder,
-            DrunkenMapBuilder,
-            MazeMapBuilder,
-        )
-        generator = self.engine.rng.choice(builders)
+        if self.floor_pack is not None:
+            index = self.floor_pack.find(
+                self.engine.seed, self.current_floor, builder_name
+            )
+            if index is not None:
+                self.engine.game_map = self.floor_pack.load_floor(index, self.engine)
+                return
+            logger.warning(
+                "Floor %d of seed %s by %s is not in %s, building it instead.",
+                self.current_floor,
+                self.engine.seed,
+                builder_name,
+                self.floor_pack.filename,
+            )
+
+        self.build_floor(builder_name, rng, progress_callback)
+
+    def build_floor(
+        self,
+        builder_name: str,
+        rng: Optional[np.random.Generator] = None,
+        progress_callback: Optional[Callable[[float], None]] = None,
+    ) -> None:
+        """Build the current floor with the map builder class named `builder_name`.
+
+        `rng` is the generator the floor is built with, by default a new one from
+        the floors map generation stream.  If the build goes over the generation
+        budget, the floor is built by FALLBACK_BUILDER instead, from the same
+        generator state, and with no step limit.
+        """
+        import map_builders
+
+        generator = getattr(map_builders, builder_name)
+        builder = self.new_builder(generator, progress_callback)
+        if rng is not None:
+            builder.rng = rng
+        # Where the fallback starts from, since the abandoned build used up an
+        # unknown number of draws.
+        fallback_rng = copy.deepcopy(builder.rng)
+        if self.generation_budget is not None:
+            builder.step_budget = (
+                self.generation_budget * self.map_width * self.map_height
+            )
+        self.build_counts[builder_name] = self.build_counts.get(builder_name, 0) + 1
+
+        try:
+            self.engine.game_map = builder.generate()
+        except exceptions.BuildTimeout:
+            self.budget_overruns[builder_name] = (
+                self.budget_overruns.get(builder_name, 0) + 1
+            )
+            logger.warning(
+                "%s went over its budget of %d steps on floor %d, using %s instead.",
+                builder_name,
+                builder.step_budget,
+                self.current_floor,
+                FALLBACK_BUILDER,
+            )
+            generator = getattr(map_builders, FALLBACK_BUILDER)
+            builder = self.new_builder(generator, progress_callback)
+            builder.rng = fallback_rng
+            self.engine.game_map = builder.generate()
+
+        if self.profile_generation:
+            self.stage_timings[self.current_floor] = dict(builder.stage_timer.timings)
+            logger.debug(
+                "Floor %d built by %s in %.1fms: %s",
+                self.current_floor,
+                generator.__name__,
+                builder.stage_timer.total * 1000,
+                builder.stage_timer.summary(),
+            )
+
+    def new_builder(
+        self,
+        generator: type,
+        progress_callback: Optional[Callable[[float], None]] = None,
+    ) -> MapBuilder:
+        """Create a builder of the class `generator` for the current floor."""
         builder = generator(
             max_rooms=self.max_rooms,
             room_min_size=self.room_min_size,
@@ -73,40 +229,189 @@ class GameWorld:
             map_height=self.map_height,
             engine=self.engine,
         )
-
-        self.engine.game_map = builder.build()
+        builder.stage_timer.enabled = self.profile_generation
+        builder.progress_callback = progress_callback
+        return builder
 
 
 class GameMap:
+    """
+    A floor of the dungeon: its tiles, what the player can see, and the entities.
+
+    Map builders fill in `tiles` directly while the map is being built.  Once it
+    is being played on, tiles are replaced with `set_tiles` and entities are
+    moved with `entity_moved`, so that `changes` can tell caches what changed.
+    """
+
     def __init__(
         self, engine: Engine, width: int, height: int, entities: Iterable[Entity] = ()
     ):
         self.engine = engine
         self.width, self.height = width, height
-        self.entities = set(entities)
+        self.entities: Set[Entity] = set()
+        # The entities split by kind, kept up to date as entities are added,
+        # removed and killed.  Dicts are used as insertion ordered sets.
+        self._live_actors: Dict[Actor, None] = {}
+        self._corpses: Dict[Actor, None] = {}
+        self._items: Dict[Item, None] = {}
+        # The corpses and items, which don't move, by their cell.  Their glyphs
+        # are drawn into a map sized layer on the first frame, after which only
+        # the cells where one is added, removed or killed are redrawn.
+        self._still_cells: Dict[Tuple[int, int], Dict[Entity, None]] = {}
+        self._still_layer: Optional[np.ndarray] = None
+        self.actor_store = ActorStore()
+        self.changes = MapChanges()
+        self.distance_maps = DistanceMaps(self)
+        for entity in entities:
+            self.add_entity(entity)
         self.tiles = np.full((width, height), fill_value=tile_types.wall, order="F")
 
         self.visible = np.full((width, height), fill_value=False, order="F")
+        # The part of `visible` which was last computed, everything else is False.
+        self.visible_area: Tuple[slice, slice] = (slice(0, 0), slice(0, 0))
+        # The viewer position and transparency version `visible` was computed for.
+        self.visible_from: Optional[Tuple[int, int, int]] = None
         self.explored = np.full((width, height), fill_value=True, order="F")
 
         self.downstairs = (0, 0)
 
+    def __getstate__(self) -> dict:
+        """Leave the entity render layer out of saves, it is redrawn when needed."""
+        state = self.__dict__.copy()
+        state["_still_layer"] = None
+        return state
+
     @property
     def gamemap(self) -> GameMap:
         return self
 
     @property
-    def actors(self) -> Iterator[Actor]:
-        """Iterate over this maps living actors."""
-        yield from (
-            entity
-            for entity in self.entities
-            if isinstance(entity, Actor) and entity.is_alive
-        )
+    def actors(self) -> KeysView[Actor]:
+        """This maps living actors, in the order they were added."""
+        return self._live_actors.keys()
 
     @property
-    def items(self) -> Iterator[Item]:
-        yield from (entity for entity in self.entities if isinstance(entity, Item))
+    def corpses(self) -> KeysView[Actor]:
+        return self._corpses.keys()
+
+    @property
+    def items(self) -> KeysView[Item]:
+        return self._items.keys()
+
+    def add_entity(self, entity: Entity) -> None:
+        self.entities.add(entity)
+        self.changes.entity_changed(entity.x, entity.y)
+        if isinstance(entity, Actor):
+            self.actor_store.add(entity)
+            if entity.is_alive:
+                self._live_actors[entity] = None
+            else:
+                self._corpses[entity] = None
+                self._add_still(entity)
+        elif isinstance(entity, Item):
+            self._items[entity] = None
+            self._add_still(entity)
+
+    def remove_entity(self, entity: Entity) -> None:
+        self.entities.remove(entity)
+        self.changes.entity_changed(entity.x, entity.y)
+        if entity in self.actor_store:
+            self.actor_store.remove(entity)
+        self._live_actors.pop(entity, None)  # type: ignore
+        if self._corpses.pop(entity, 0) is None:  # type: ignore
+            self._remove_still(entity)
+        if self._items.pop(entity, 0) is None:  # type: ignore
+            self._remove_still(entity)
+
+    def actor_died(self, actor: Actor) -> None:
+        """Move an actor on this map which has just died over to the corpses."""
+        if self._live_actors.pop(actor, 0) is None:
+            self._corpses[actor] = None
+            self._add_still(actor)
+            self.changes.entity_changed(actor.x, actor.y)
+
+    def _add_still(self, entity: Entity) -> None:
+        self._still_cells.setdefault((entity.x, entity.y), {})[entity] = None
+        self._redraw_still_cell(entity.x, entity.y)
+
+    def _remove_still(self, entity: Entity) -> None:
+        cell = (entity.x, entity.y)
+        entities = self._still_cells[cell]
+        del entities[entity]
+        if not entities:
+            del self._still_cells[cell]
+        self._redraw_still_cell(*cell)
+
+    def _redraw_still_cell(self, x: int, y: int) -> None:
+        """Redraw one cell of the still layer, if the layer has been drawn."""
+        if self._still_layer is None:
+            return
+        entities = self._still_cells.get((x, y))
+        if not entities:
+            self._still_layer[x, y] = (0, (0, 0, 0))
+            return
+        # The last one added of those with the highest render order is on top.
+        top = max(reversed(entities), key=lambda entity: entity.render_order.value)
+        self._still_layer[x, y] = (ord(top.char), top.color)
+
+    def entity_moved(self, entity: Entity, from_x: int, from_y: int) -> None:
+        """Update the map after `entity` has moved here from (from_x, from_y)."""
+        self.actor_store.update_position(entity)  # type: ignore
+        self.changes.entity_changed(from_x, from_y)
+        self.changes.entity_changed(entity.x, entity.y)
+
+    def set_tiles(self, index: object, tiles: np.ndarray) -> None:
+        """Replace the tiles at `index`, which is anything that can index `tiles`."""
+        before = self.tiles[index].copy()
+        self.tiles[index] = tiles
+        after = self.tiles[index]
+
+        rect = None
+        if self.changes.collect_dirty:
+            touched = np.zeros(self.tiles.shape, dtype=bool)
+            touched[index] = True
+            xs, ys = np.nonzero(touched)
+            if len(xs):
+                rect = (
+                    int(xs.min()),
+                    int(ys.min()),
+                    int(xs.max()) + 1,
+                    int(ys.max()) + 1,
+                )
+        self.changes.tiles_changed(
+            rect,
+            walkable=bool(np.any(before["walkable"] != after["walkable"])),
+            transparent=bool(np.any(before["transparent"] != after["transparent"])),
+        )
+
+    def check_entity_collections(self) -> None:
+        """
+        Raise AssertionError if the kinds of entities don't match `entities`, or
+        the corpses and items aren't indexed by their cells.
+        """
+        actors = [entity for entity in self.entities if isinstance(entity, Actor)]
+        expected = (
+            {actor for actor in actors if actor.is_alive},
+            {actor for actor in actors if not actor.is_alive},
+            {entity for entity in self.entities if isinstance(entity, Item)},
+        )
+        found = (set(self._live_actors), set(self._corpses), set(self._items))
+        for name, want, have in zip(("actors", "corpses", "items"), expected, found):
+            if want != have:
+                raise AssertionError(
+                    f"{name} has drifted: missing {len(want - have)},"
+                    f" extra {len(have - want)}"
+                )
+        still = {
+            (entity, (entity.x, entity.y)) for entity in (*expected[1], *expected[2])
+        }
+        indexed = {
+            (entity, cell)
+            for cell, entities in self._still_cells.items()
+            for entity in entities
+        }
+        if still != indexed:
+            raise AssertionError("The cells of the corpses and items have drifted.")
 
     def get_blocking_entity_at_location(
         self, location_x: int, location_y: int
@@ -122,37 +427,115 @@ class GameMap:
         return None
 
     def get_actor_at_location(self, x: int, y: int) -> Optional[Actor]:
-        for actor in self.actors:
-            if actor.x == x and actor.y == y:
-                return actor
+        return self.actor_store.actor_at(x, y)
 
-        return None
+    def actors_in_radius(self, x: int, y: int, radius: float) -> List[Actor]:
+        """Return the living actors within `radius` of (x, y)."""
+        return self.actor_store.in_radius(x, y, radius)
+
+    def nearest_actor(
+        self,
+        x: int,
+        y: int,
+        max_range: float,
+        filter: Optional[Callable[[Actor], bool]] = None,
+    ) -> Optional[Actor]:
+        """
+        Return the closest living actor to (x, y) within `max_range`, if any.
+
+        Only actors for which `filter` returns True are considered.
+        """
+        return self.actor_store.nearest(x, y, max_range, filter)
+
+    def actors_in_rect(
+        self, left: int, top: int, right: int, bottom: int
+    ) -> List[Actor]:
+        """Return the living actors with left <= x < right and top <= y < bottom."""
+        return self.actor_store.in_rect(left, top, right, bottom)
+
+    def hostile_in_view(self) -> bool:
+        """Return True if a living actor other than the player is visible."""
+        store = self.actor_store
+        data = store.data
+        seen = data["alive"] & self.visible[data["x"], data["y"]]
+        player_index = store.index_of.get(self.engine.player)
+        if player_index is not None:
+            seen[player_index] = False
+        return bool(seen.any())
 
     def in_bounds(self, x: int, y: int) -> bool:
         """Return True if inside bounds of map"""
         return 0 <= x < self.width and 0 <= y < self.height
 
-    def render(self, console: Console) -> None:
+    def render(self, console: Console, camera: Camera) -> None:
         """
-        Renders the map.
+        Renders the part of the map in view of the camera.
 
         If a tile is in the "visible" array, then draw it with the "light" colors.
         If it isn't, but it's in the "explored" array, then draw it with the "dark" colors.
         Otherwise, the default is "SHROUD".
         """
+        view = camera.view_slices(self.width, self.height)
+        view_width = view[0].stop - view[0].start
+        view_height = view[1].stop - view[1].start
 
-        console.tiles_rgb[0 : self.width, 0 : self.height] = np.select(
-            condlist=[self.visible, self.explored],
-            choicelist=[self.tiles["light"], self.tiles["dark"]],
+        console.tiles_rgb[0:view_width, 0:view_height] = np.select(
+            condlist=[self.visible[view], self.explored[view]],
+            choicelist=[self.tiles["light"][view], self.tiles["dark"][view]],
             default=tile_types.SHROUD,
         )
 
-        entities_sorted_for_rendering = sorted(
-            self.entities, key=lambda x: x.render_order.value
+        self.render_entities(console, camera)
+
+    def render_entities(self, console: Console, camera: Camera) -> None:
+        """
+        Draw the glyphs of the visible entities in view of the camera.
+
+        Entities with a higher render order are drawn over the ones below them.
+        The corpses and items are copied from the still layer for the whole view
+        at once, so drawing them takes the same time however many there are, and
+        changes to them only redraw their own cell of the layer.
+        The living actors are gathered into an array every frame and written with
+        one assignment, instead of printing every entity.
+        """
+        if self._still_layer is None:
+            self._still_layer = self.draw_still_layer()
+        view = camera.view_slices(self.width, self.height)
+        still = self._still_layer[view]
+        shown = (still["ch"] != 0) & self.visible[view]
+        tiles = console.tiles_rgb[: shown.shape[0], : shown.shape[1]]
+        tiles["ch"][shown] = still["ch"][shown]
+        tiles["fg"][shown] = still["fg"][shown]
+
+        glyphs = topmost_glyphs(entity_glyphs(self._live_actors))
+        x, y = glyphs["x"], glyphs["y"]
+        shown = (
+            (camera.x <= x)
+            & (x < camera.x + camera.width)
+            & (camera.y <= y)
+            & (y < camera.y + camera.height)
         )
+        shown[shown] = self.visible[x[shown], y[shown]]
+        glyphs = glyphs[shown]
 
-        for entity in entities_sorted_for_rendering:
-            if self.visible[entity.x, entity.y]:
-                console.print(
-                    x=entity.x, y=entity.y, string=entity.char, fg=entity.color
-                )
+        screen_x, screen_y = camera.to_screen(glyphs["x"], glyphs["y"])
+        tiles = console.tiles_rgb
+        tiles["ch"][screen_x, screen_y] = glyphs["ch"]
+        tiles["fg"][screen_x, screen_y] = np.stack(
+            (glyphs["r"], glyphs["g"], glyphs["b"]), axis=-1
+        )
+
+    def draw_still_layer(self) -> np.ndarray:
+        """
+        Return the glyphs of the corpses and items as a map sized array, with a
+        codepoint of 0 where there are none.
+        """
+        glyphs = topmost_glyphs(entity_glyphs([*self._corpses, *self._items]))
+        layer = np.zeros(
+            (self.width, self.height), dtype=[("ch", np.int32), ("fg", "3u1")]
+        )
+        layer["ch"][glyphs["x"], glyphs["y"]] = glyphs["ch"]
+        layer["fg"][glyphs["x"], glyphs["y"]] = np.stack(
+            (glyphs["r"], glyphs["g"], glyphs["b"]), axis=-1
+        )
+        return layer
@@ -1,4 +1,6 @@
 from __future__ import annotations
+import asyncio
+import traceback
 from typing import Callable, Optional, Tuple, TYPE_CHECKING, Union
 
 import tcod.event
@@ -6,10 +8,9 @@ import tcod.event
 import actions
 from actions import Action, BumpAction, PickupAction, WaitAction
 import color
+from engine import SAVE_FILENAME, delete_save
 import exceptions
 
-import os
-
 if TYPE_CHECKING:
     from engine import Engine
     from entity import Item
@@ -55,6 +56,16 @@ CONFIRM_KEYS = {
     tcod.event.K_KP_ENTER,
 }
 
+# Running, resting and travelling stop after this many turns at the most.
+MAX_REPEATED_TURNS = 100
+
+# Resting stops after this many turns in a row which heal nothing.
+REST_TURNS_WITHOUT_HEALING = 20
+
+# The F4 debug key writes a cProfile capture of this many turns to this file.
+PROFILE_TURNS = 50
+PROFILE_FILENAME = "turns.prof"
+
 ActionOrHandler = Union[Action, "BaseEventHandler"]
 """An event handler return value which can trigger an action or switch active handlers.
 
@@ -65,6 +76,14 @@ MainGameEventHandler will become the active handler.
 
 
 class BaseEventHandler(tcod.event.EventDispatch[ActionOrHandler]):
+    # Handlers which show something changing on their own are drawn every frame,
+    # the others only after an event.
+    redraw_every_frame = False
+
+    def update(self) -> BaseEventHandler:
+        """Called by the game loop every frame, returns the next active handler."""
+        return self
+
     def handle_events(self, event: tcod.event.Event) -> BaseEventHandler:
         """Handle an event and return the next active event handler."""
         state = self.dispatch(event)
@@ -107,6 +126,73 @@ class PopupMessage(BaseEventHandler):
         return self.parent
 
 
+class ProgressHandler(BaseEventHandler):
+    """
+    Show a progress bar over the parent handler while `job` runs, then switch to
+    the handler it returns.
+
+    `job` is called with a callback which takes the fraction of the job done.  It
+    runs on a worker thread when there is a running asyncio loop, so the window
+    keeps responding, and right away otherwise, such as during a replay.  Input
+    is ignored until the job is done.
+    """
+
+    redraw_every_frame = True
+
+    def __init__(
+        self,
+        parent_handler: BaseEventHandler,
+        title: str,
+        job: Callable[[Callable[[float], None]], BaseEventHandler],
+    ):
+        self.parent = parent_handler
+        self.title = title
+        self.job = job
+        self.progress = 0.0
+        self.future: Optional[asyncio.Future[BaseEventHandler]] = None
+
+    def start(self) -> BaseEventHandler:
+        """Start the job, and return the handler to switch to meanwhile."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.job(self.report)
+        self.future = loop.run_in_executor(None, self.job, self.report)
+        return self
+
+    def report(self, fraction: float) -> None:
+        """Called by the job, possibly from another thread."""
+        self.progress = fraction
+
+    def update(self) -> BaseEventHandler:
+        if self.future is None or not self.future.done():
+            return self
+        try:
+            return self.future.result()
+        except Exception as exc:
+            traceback.print_exc()  # Print to stderr.
+            return PopupMessage(self.parent, f"{self.title}\nFailed: {exc}")
+
+    def on_render(self, console: tcod.Console) -> None:
+        """Render the parent and dim the result, then draw the bar on top."""
+        self.parent.on_render(console)
+        console.tiles_rgb["fg"] //= 8
+        console.tiles_rgb["bg"] //= 8
+
+        width = console.width // 2
+        x = (console.width - width) // 2
+        y = console.height // 2
+        console.print(
+            console.width // 2, y - 1, self.title, fg=color.white, alignment=tcod.CENTER
+        )
+        console.draw_rect(x=x, y=y, width=width, height=1, ch=1, bg=color.bar_empty)
+        filled = int(width * min(max(self.progress, 0.0), 1.0))
+        if filled > 0:
+            console.draw_rect(
+                x=x, y=y, width=filled, height=1, ch=1, bg=color.bar_filled
+            )
+
+
 class EventHandler(BaseEventHandler):
     def __init__(self, engine: Engine):
         self.engine = engine
@@ -118,12 +204,42 @@ class EventHandler(BaseEventHandler):
             return action_or_state
         if self.handle_action(action_or_state):
             # A valid action was performed.
-            if not self.engine.player.is_alive:
-                # The player was killed sometime during or after the action.
-                return GameOverEventHandler(self.engine)
-            elif self.engine.player.level.requires_level_up:
-                return LevelUpEventHandler(self.engine)
-            return MainGameEventHandler(self.engine)  # Return to the main handler.
+            return self.after_turn()
+        return self
+
+    def after_turn(self) -> BaseEventHandler:
+        """Return the handler which should be active after a turn was taken."""
+        if not self.engine.player.is_alive:
+            # The player was killed sometime during or after the action.
+            return GameOverEventHandler(self.engine)
+        elif self.engine.player.level.requires_level_up:
+            return LevelUpEventHandler(self.engine)
+        return MainGameEventHandler(self.engine)  # Return to the main handler.
+
+    def repeat_actions(
+        self, next_action: Callable[[], Optional[Action]]
+    ) -> BaseEventHandler:
+        """Take turns with the actions from `next_action` until it returns None.
+
+        All the turns are taken before anything is drawn again.  Repeating stops
+        early when an action is impossible, when the player has to level up or
+        dies, or when anything hostile is in view after a turn.
+        """
+        player = self.engine.player
+        turns = 0
+        for _ in range(MAX_REPEATED_TURNS):
+            action = next_action()
+            if action is None or not self.handle_action(action):
+                break
+            turns += 1
+            if (
+                not player.is_alive
+                or player.level.requires_level_up
+                or self.engine.game_map.hostile_in_view()
+            ):
+                break
+        if turns:
+            return self.after_turn()
         return self
 
     def handle_action(self, action: Optional[Action]) -> bool:
@@ -134,20 +250,34 @@ class EventHandler(BaseEventHandler):
         if action is None:
             return False
 
+        profiler = self.engine.profiler
+
         try:
-            action.perform()
+            with profiler.phase("perform"):
+                action.perform()
         except exceptions.Impossible as exc:
             self.engine.message_log.add_message(exc.args[0], color.impossible)
             return False  # Skip enemy turn on exceptions.
 
-        self.engine.handle_enemy_turns()
+        with profiler.phase("enemy_turns"):
+            self.engine.handle_enemy_turns()
 
-        self.engine.update_fov()
+        with profiler.phase("fov"):
+            self.engine.update_fov()
+
+        profile_filename = profiler.end_turn()
+        if profile_filename:
+            self.engine.message_log.add_message(
+                f"Profile written to {profile_filename}.", color.debug
+            )
+        if self.engine.recorder:
+            self.engine.recorder.record_action(action)
         return True
 
     def ev_mousemotion(self, event: tcod.event.MouseMotion) -> None:
-        if self.engine.game_map.in_bounds(event.tile.x, event.tile.y):
-            self.engine.mouse_location = event.tile.x, event.tile.y
+        x, y = self.engine.camera.to_map(event.tile.x, event.tile.y)
+        if self.engine.game_map.in_bounds(x, y) and self.engine.camera.in_view(x, y):
+            self.engine.mouse_location = x, y
 
     def on_render(self, console: tcod.Console) -> None:
         self.engine.render(console)
@@ -195,9 +325,11 @@ class SelectIndexHandler(AskUserEventHandler):
     def on_render(self, console: tcod.Console) -> None:
         """Highlight the tile under the cursor."""
         super().on_render(console)
-        x, y = self.engine.mouse_location
-        console.tiles_rgb["bg"][x, y] = color.white
-        console.tiles_rgb["fg"][x, y] = color.black
+        camera = self.engine.camera
+        if camera.in_view(*self.engine.mouse_location):
+            x, y = camera.to_screen(*self.engine.mouse_location)
+            console.tiles_rgb["bg"][x, y] = color.white
+            console.tiles_rgb["fg"][x, y] = color.black
 
     def ev_keydown(self, event: tcod.event.KeyDown) -> Optional[ActionOrHandler]:
         """Check for key movement or confirmation keys."""
@@ -215,9 +347,12 @@ class SelectIndexHandler(AskUserEventHandler):
             dx, dy = MOVE_KEYS[key]
             x += dx * modifier
             y += dy * modifier
-            # Clamp the cursor index to the map size.
-            x = max(0, min(x, self.engine.game_map.width - 1))
-            y = max(0, min(y, self.engine.game_map.height - 1))
+            # Clamp the cursor index to the part of the map on screen.
+            view_x, view_y = self.engine.camera.view_slices(
+                self.engine.game_map.width, self.engine.game_map.height
+            )
+            x = max(view_x.start, min(x, view_x.stop - 1))
+            y = max(view_y.start, min(y, view_y.stop - 1))
             self.engine.mouse_location = x, y
             return None
         elif key in CONFIRM_KEYS:
@@ -228,9 +363,10 @@ class SelectIndexHandler(AskUserEventHandler):
         self, event: tcod.event.MouseButtonDown
     ) -> Optional[ActionOrHandler]:
         """Left click confirms a selection."""
-        if self.engine.game_map.in_bounds(*event.tile):
+        x, y = self.engine.camera.to_map(*event.tile)
+        if self.engine.game_map.in_bounds(x, y) and self.engine.camera.in_view(x, y):
             if event.button == 1:
-                return self.on_index_selected(*event.tile)
+                return self.on_index_selected(x, y)
         return super().ev_mousebuttondown(event)
 
     def on_index_selected(self, x: int, y: int) -> Optional[ActionOrHandler]:
@@ -393,7 +529,7 @@ class AreaRangedAttackHandler(SelectIndexHandler):
         """Highlight the tile under the cursor."""
         super().on_render(console)
 
-        x, y = self.engine.mouse_location
+        x, y = self.engine.camera.to_screen(*self.engine.mouse_location)
 
         # Draw a rectangle around the targeted area, so the player can see the affected tiles.
         console.draw_frame(
@@ -423,11 +559,17 @@ class MainGameEventHandler(EventHandler):
         ):
             return actions.TakeStairsAction(player)
 
-        if key in MOVE_KEYS:
+        if key in MOVE_KEYS and modifier & (
+            tcod.event.KMOD_LSHIFT | tcod.event.KMOD_RSHIFT
+        ):
+            return self.run(*MOVE_KEYS[key])
+        elif key in MOVE_KEYS:
             dx, dy = MOVE_KEYS[key]
             action = BumpAction(player, dx, dy)
         elif key in WAIT_KEYS:
             action = WaitAction(player)
+        elif key == tcod.event.K_r:
+            return self.rest()
         elif key == tcod.event.K_ESCAPE:
             raise SystemExit()
         elif key == tcod.event.K_v:
@@ -442,15 +584,131 @@ class MainGameEventHandler(EventHandler):
             return CharacterScreenEventHandler(self.engine)
         elif key == tcod.event.K_SLASH:
             return LookHandler(self.engine)
+        elif key == tcod.event.K_F3:
+            # Debug: show turn timings.
+            self.engine.profiler.toggle()
+        elif key == tcod.event.K_F4:
+            # Debug: profile the next few turns.
+            self.engine.profiler.capture(PROFILE_TURNS, PROFILE_FILENAME)
+            self.engine.message_log.add_message(
+                f"Profiling the next {PROFILE_TURNS} turns.", color.debug
+            )
         # No valid key was pressed
         return action
 
+    def ev_mousebuttondown(
+        self, event: tcod.event.MouseButtonDown
+    ) -> Optional[ActionOrHandler]:
+        """Left click travels to the clicked tile."""
+        x, y = self.engine.camera.to_map(*event.tile)
+        game_map = self.engine.game_map
+        if (
+            event.button == tcod.event.BUTTON_LEFT
+            and game_map.in_bounds(x, y)
+            and self.engine.camera.in_view(x, y)
+            and game_map.explored[x, y]
+            and game_map.tiles["walkable"][x, y]
+        ):
+            return self.travel(x, y)
+        return None
+
+    def run(self, dx: int, dy: int) -> BaseEventHandler:
+        """Move in a direction until something is in the way or worth stopping for.
+
+        The first step is a normal bump, so running into a wall or an enemy does
+        the same as a single step would.
+        """
+        player = self.engine.player
+        game_map = self.engine.game_map
+        steps = 0
+
+        def next_action() -> Optional[Action]:
+            nonlocal steps
+            steps += 1
+            if steps == 1:
+                return BumpAction(player, dx, dy)
+
+            if (player.x, player.y) == game_map.downstairs or any(
+                item.x == player.x and item.y == player.y for item in game_map.items
+            ):
+                return None
+            x, y = player.x + dx, player.y + dy
+            if (
+                not game_map.in_bounds(x, y)
+                or not game_map.tiles["walkable"][x, y]
+                or game_map.get_blocking_entity_at_location(x, y)
+            ):
+                return None
+            return actions.MovementAction(player, dx, dy)
+
+        return self.repeat_actions(next_action)
+
+    def rest(self) -> BaseEventHandler:
+        """Wait until healed.
+
+        Resting stops once REST_TURNS_WITHOUT_HEALING turns in a row have healed
+        nothing, so slow regeneration still gets the chance to heal, but resting
+        without any regeneration doesn't use up the whole turn limit.
+        """
+        fighter = self.engine.player.fighter
+        if fighter.hp == fighter.max_hp:
+            self.engine.message_log.add_message(
+                "You are already fully rested.", color.impossible
+            )
+            return self
+        if self.engine.game_map.hostile_in_view():
+            self.engine.message_log.add_message(
+                "You cannot rest with enemies in view.", color.impossible
+            )
+            return self
+
+        best_hp = fighter.hp
+        turns_without_healing = 0
+
+        def next_action() -> Optional[Action]:
+            nonlocal best_hp, turns_without_healing
+            if fighter.hp == fighter.max_hp:
+                return None
+            if fighter.hp > best_hp:
+                best_hp = fighter.hp
+                turns_without_healing = 0
+            elif turns_without_healing == REST_TURNS_WITHOUT_HEALING:
+                self.engine.message_log.add_message("Resting doesn't help.")
+                return None
+            turns_without_healing += 1
+            return WaitAction(self.engine.player)
+
+        return self.repeat_actions(next_action)
+
+    def travel(self, x: int, y: int) -> BaseEventHandler:
+        """Walk to (x, y) along the shortest path."""
+        player = self.engine.player
+        game_map = self.engine.game_map
+
+        # A single distance map to the destination covers the whole trip, and is
+        # kept for travelling there again.
+        distances = game_map.distance_maps.get([(x, y)])
+        if distances.at(player.x, player.y) is None:
+            self.engine.message_log.add_message(
+                "You don't know a way there.", color.impossible
+            )
+            return self
+
+        def next_action() -> Optional[Action]:
+            for dest_x, dest_y in distances.downhill(player.x, player.y):
+                if not game_map.get_blocking_entity_at_location(dest_x, dest_y):
+                    return actions.MovementAction(
+                        player, dest_x - player.x, dest_y - player.y
+                    )
+            return None
+
+        return self.repeat_actions(next_action)
+
 
 class GameOverEventHandler(EventHandler):
     def on_quit(self) -> None:
         """Handle exiting out of a finished game."""
-        if os.path.exists("savegame.sav"):
-            os.remove("savegame.sav")  # Deletes the active save file.
+        delete_save(SAVE_FILENAME)  # Deletes the active save file.
         raise exceptions.QuitWithoutSaving()  # Avoid saving a finished game.
 
     def ev_quit(self, event: tcod.event.Quit) -> None:
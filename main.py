@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
-import traceback
+import argparse
+import asyncio
+import contextlib
+import secrets
 
 import tcod
-import color
+from engine import SAVE_FILENAME
 import exceptions
+from game_loop import GameLoop
 import input_handlers
+from recording import InputRecorder
 import setup_game
 
 
@@ -16,6 +21,21 @@ def save_game(handler: input_handlers.BaseEventHandler, filename: str) -> None:
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, help="seed for new games")
+    parser.add_argument(
+        "--record", metavar="FILE", help="record the session for tools.replay"
+    )
+    args = parser.parse_args()
+
+    seed = args.seed
+    recorder = None
+    if args.record:
+        # A recording needs a known seed to replay from.
+        if seed is None:
+            seed = secrets.randbits(63)
+        recorder = InputRecorder(args.record, seed)
+
     screen_width = 80
     screen_height = 50
 
@@ -23,9 +43,9 @@ def main():
         "resources/dejavu10x10_gs_tc.png", 32, 8, tcod.tileset.CHARMAP_TCOD
     )
 
-    handler: input_handlers.BaseEventHandler = setup_game.MainMenu()
+    handler: input_handlers.BaseEventHandler = setup_game.MainMenu(seed=seed)
 
-    with tcod.context.new_terminal(
+    with recorder or contextlib.nullcontext(), tcod.context.new_terminal(
         screen_width,
         screen_height,
         tileset=tileset,
@@ -33,31 +53,17 @@ def main():
         vsync=True,
     ) as context:
         root_console = tcod.Console(screen_width, screen_height, order="F")
+        loop = GameLoop(context, root_console, handler, recorder)
 
         try:
-            while True:
-                root_console.clear()
-                handler.on_render(console=root_console)
-                context.present(root_console)
-
-                try:
-                    for event in tcod.event.wait():
-                        context.convert_event(event)
-                        handler = handler.handle_events(event)
-                except Exception:  # Handle exceptions in game.
-                    traceback.print_exc()  # Print error to stderr.
-                    # Then print the error to the message log.
-                    if isinstance(handler, input_handlers.EventHandler):
-                        handler.engine.message_log.add_message(
-                            traceback.format_exc(), color.error
-                        )
+            asyncio.run(loop.run())
         except exceptions.QuitWithoutSaving:
             raise
         except SystemExit:  # Save and quit.
-            save_game(handler, "savegame.sav")
+            save_game(loop.handler, SAVE_FILENAME)
             raise
         except BaseException:  # Save on any other unexpected exception.
-            save_game(handler, "savegame.sav")
+            save_game(loop.handler, SAVE_FILENAME)
             raise
 
 
@@ -1,9 +1,45 @@
-from .map_builder import MapBuilder
-from .simple_map import SimpleMapBuilder
-from .bsp_map import BSPMapBuilder
-from .bsp_interior_map import BSPInteriorMapBuilder
-from .evil_cellular_map import EvilCellularMapBuilder
-from .cellular_map import CellularMapBuilder
-from .drunken_map import DrunkenMapBuilder
-from .maze_map import MazeMapBuilder
-from .dla_map import DLAMapBuilder
+"""
+Map builders are only imported when they are first used, since several of them
+pull in scipy, which is slow to import.
+"""
+import importlib
+from typing import TYPE_CHECKING
+
+_MODULES = {
+    "MapBuilder": ".map_builder",
+    "StageTimer": ".stage_timer",
+    "SimpleMapBuilder": ".simple_map",
+    "BSPMapBuilder": ".bsp_map",
+    "BSPInteriorMapBuilder": ".bsp_interior_map",
+    "EvilCellularMapBuilder": ".evil_cellular_map",
+    "CellularMapBuilder": ".cellular_map",
+    "DrunkenMapBuilder": ".drunken_map",
+    "MazeMapBuilder": ".maze_map",
+    "DLAMapBuilder": ".dla_map",
+}
+
+__all__ = list(_MODULES)
+
+
+def __getattr__(name: str):
+    try:
+        module_name = _MODULES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # Skip this lookup next time.
+    return value
+
+
+if TYPE_CHECKING:
+    from .map_builder import MapBuilder
+    from .stage_timer import StageTimer
+    from .simple_map import SimpleMapBuilder
+    from .bsp_map import BSPMapBuilder
+    from .bsp_interior_map import BSPInteriorMapBuilder
+    from .evil_cellular_map import EvilCellularMapBuilder
+    from .cellular_map import CellularMapBuilder
+    from .drunken_map import DrunkenMapBuilder
+    from .maze_map import MazeMapBuilder
+    from .dla_map import DLAMapBuilder
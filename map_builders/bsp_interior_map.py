@@ -2,7 +2,13 @@ from typing import List, Tuple
 from tcod import Bsp
 
 from map_builders.map_builder import MapBuilder
-from map_builders.common import RectangularRoom, tunnel_between, place_entities
+from map_builders.common import (
+    RectangularRoom,
+    tunnel_between,
+    connect_regions,
+    place_entities_in_regions,
+    split_recursive,
+)
 
 from game_map import GameMap
 import tile_types
@@ -40,13 +46,14 @@ class BSPInteriorMapBuilder(MapBuilder):
         rooms: List[RectangularRoom] = []
 
         bsp = Bsp(x=0, y=0, width=self.map_width, height=self.map_height)
-        bsp.split_recursive(
+        split_recursive(
+            bsp,
+            self.rng,
             depth=5,
             min_width=self.room_min_size + 1,
             min_height=self.room_min_size + 1,
             max_horizontal_ratio=1.5,
             max_vertical_ratio=1.5,
-            seed=self.engine.seed,
         )
 
         for node in bsp.pre_order():
@@ -54,7 +61,7 @@ class BSPInteriorMapBuilder(MapBuilder):
                 node1, node2 = node.children
 
                 for x, y in tunnel_between(
-                    node_center(node1), node_center(node2), dungeon
+                    node_center(node1), node_center(node2), self.rng
                 ):
                     dungeon.tiles[x, y] = tile_types.floor
 
@@ -63,12 +70,17 @@ class BSPInteriorMapBuilder(MapBuilder):
                 rooms.append(room)
                 dungeon.tiles[room.inner] = tile_types.floor
 
-                place_entities(
-                    room.cells, dungeon, self.engine.game_world.current_floor
-                )
+        # The tunnels between the centers of split nodes can miss the rooms.
+        connect_regions(dungeon, self.rng)
 
         player.place(*rooms[0].center, dungeon)
 
+        place_entities_in_regions(
+            [room.cells for room in rooms],
+            dungeon,
+            self.engine.game_world.current_floor,
+        )
+
         return dungeon
 
     def build_room(self, node: Bsp) -> RectangularRoom:
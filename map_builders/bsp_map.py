@@ -2,7 +2,12 @@ from typing import List, Tuple
 from tcod import Bsp
 
 from map_builders.map_builder import MapBuilder
-from map_builders.common import RectangularRoom, tunnel_between, place_entities
+from map_builders.common import (
+    RectangularRoom,
+    tunnel_between,
+    place_entities_in_regions,
+    split_recursive,
+)
 
 from game_map import GameMap
 import tile_types
@@ -35,13 +40,14 @@ class BSPMapBuilder(MapBuilder):
         rooms: List[RectangularRoom] = []
 
         bsp = Bsp(x=0, y=0, width=self.map_width, height=self.map_height)
-        bsp.split_recursive(
+        split_recursive(
+            bsp,
+            self.rng,
             depth=5,
             min_width=self.room_min_size + 1,
             min_height=self.room_min_size + 1,
             max_horizontal_ratio=1.5,
             max_vertical_ratio=1.5,
-            seed=self.engine.seed,
         )
 
         for node in bsp.pre_order():
@@ -49,7 +55,7 @@ class BSPMapBuilder(MapBuilder):
                 node1, node2 = node.children
 
                 for x, y in tunnel_between(
-                    node_center(node1), node_center(node2), dungeon
+                    node_center(node1), node_center(node2), self.rng
                 ):
                     dungeon.tiles[x, y] = tile_types.floor
 
@@ -58,12 +64,14 @@ class BSPMapBuilder(MapBuilder):
                 rooms.append(room)
                 dungeon.tiles[room.inner] = tile_types.floor
 
-                place_entities(
-                    room.cells, dungeon, self.engine.game_world.current_floor
-                )
-
         player.place(*rooms[0].center, dungeon)
 
+        place_entities_in_regions(
+            [room.cells for room in rooms],
+            dungeon,
+            self.engine.game_world.current_floor,
+        )
+
         center_of_last = rooms[-1].center
         dungeon.tiles[center_of_last] = tile_types.down_stairs
         dungeon.downstairs = center_of_last
@@ -71,11 +79,11 @@ class BSPMapBuilder(MapBuilder):
         return dungeon
 
     def build_room(self, node: Bsp) -> RectangularRoom:
-        room_width = self.engine.rng.integers(node.width // 2, node.width - 1)
-        room_height = self.engine.rng.integers(node.height // 2, node.height - 1)
+        room_width = self.rng.integers(node.width // 2, node.width - 1)
+        room_height = self.rng.integers(node.height // 2, node.height - 1)
 
-        x = self.engine.rng.integers(node.x, node.x + node.width - room_width - 1)
-        y = self.engine.rng.integers(node.y, node.y + node.height - room_height - 1)
+        x = self.rng.integers(node.x, node.x + node.width - room_width - 1)
+        y = self.rng.integers(node.y, node.y + node.height - room_height - 1)
 
         # "RectangularRoom" class makes rectangles easier to work with
         new_room = RectangularRoom(x, y, room_width, room_height)
@@ -4,8 +4,9 @@ from scipy.signal import convolve2d
 
 from map_builders.map_builder import MapBuilder
 from map_builders.common import (
-    place_entities,
+    place_entities_in_regions,
     generate_voronoi_regions,
+    connect_regions,
     generate_dijkstra_map,
     exit_from_dijk,
 )
@@ -43,13 +44,12 @@ class CellularMapBuilder(MapBuilder):
         )
 
         is_wall = (
-            self.engine.rng.random(
-                size=(self.map_width, self.map_height), dtype=np.float32
-            )
+            self.rng.random(size=(self.map_width, self.map_height), dtype=np.float32)
             > 0.55
         )
 
-        for _ in range(0, 10):
+        for i in range(0, 10):
+            self.report_progress(i / 10)
             neighbors = convolve2d(is_wall, [[1, 1, 1], [1, 0, 1], [1, 1, 1]], "same")
             is_wall = (neighbors > 4) | (neighbors == 0)
 
@@ -60,19 +60,18 @@ class CellularMapBuilder(MapBuilder):
 
         dungeon.tiles[:] = np.where(is_wall, tile_types.wall, tile_types.floor)
 
-        player.place(int(self.map_width / 2), int(self.map_height / 2), dungeon)
-        while dungeon.tiles[player.x, player.y] == tile_types.wall:
-            player.place(player.x - 1, player.y, dungeon)
+        # Pockets too small to be worth a tunnel are filled in.
+        player.place(*connect_regions(dungeon, self.rng, min_size=8), dungeon)
 
         dijk_map = generate_dijkstra_map(dungeon, (player.x, player.y))
-        exit_tile = exit_from_dijk(dungeon, dijk_map, cull_unreachable=True)
+        exit_tile = exit_from_dijk(dungeon, dijk_map)
 
         dungeon.tiles[exit_tile] = tile_types.down_stairs
         dungeon.downstairs = exit_tile
-        regions = generate_voronoi_regions(dungeon)
+        regions = generate_voronoi_regions(dungeon, self.rng)
 
-        for region in regions:
-            if len(region) > 0:
-                place_entities(region, dungeon, self.engine.game_world.current_floor)
+        place_entities_in_regions(
+            regions, dungeon, self.engine.game_world.current_floor
+        )
 
         return dungeon
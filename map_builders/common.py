@@ -1,17 +1,17 @@
 from __future__ import annotations
-from typing import Iterator, TYPE_CHECKING, Tuple, List, Dict
+from typing import Iterator, TYPE_CHECKING, Tuple, List
 import tcod
-from scipy import spatial
 import numpy as np
 
 import entity_factories
 import random
 from game_map import GameMap
+from map_builders.stage_timer import timed_stage
 from spawn_table import (
     max_items_by_floor,
     max_monsters_by_floor,
-    enemy_chances,
-    item_chances,
+    enemy_spawn_table,
+    item_spawn_table,
 )
 import tile_types
 
@@ -57,12 +57,12 @@ class RectangularRoom:
 
 
 def tunnel_between(
-    start: Tuple[int, int], end: Tuple[int, int], dungeon: GameMap
+    start: Tuple[int, int], end: Tuple[int, int], rng: np.random.Generator
 ) -> Iterator[Tuple[int, int]]:
     """Return an L-shaped tunnel between these two points."""
     x1, y1 = start
     x2, y2 = end
-    if dungeon.engine.rng.random() < 0.5:  # 50% chance.
+    if rng.random() < 0.5:  # 50% chance.
         # Move horizontally, then vertically.
         corner_x, corner_y = x2, y1
     else:
@@ -76,52 +76,186 @@ def tunnel_between(
         yield x, y
 
 
-def generate_voronoi_regions(dungeon: GameMap):
-    cells = [
-        (x, y)
-        for x in range(0, dungeon.width - 1)
-        for y in range(0, dungeon.height - 1)
-    ]
-    points = []
+def split_recursive(
+    node: tcod.bsp.BSP,
+    rng: np.random.Generator,
+    depth: int,
+    min_width: int,
+    min_height: int,
+    max_horizontal_ratio: float,
+    max_vertical_ratio: float,
+) -> None:
+    """
+    Split a BSP node recursively, the same way as `BSP.split_recursive`.
+
+    The random choices come from `rng` instead of a tcod Random, which older and
+    newer versions of tcod expect to be passed in different ways.
+    """
+    if depth == 0 or (node.width < 2 * min_width and node.height < 2 * min_height):
+        return
+
+    # Promote square rooms.
+    if node.height < 2 * min_height or node.width > node.height * max_horizontal_ratio:
+        horizontal = False
+    elif node.width < 2 * min_width or node.height > node.width * max_vertical_ratio:
+        horizontal = True
+    else:
+        horizontal = bool(rng.integers(0, 2))
 
-    # Randomly generate a list of points
-    for i in range(0, dungeon.engine.rng.integers(20, 30)):
-        points.append(dungeon.engine.rng.choice(cells))
+    if horizontal:
+        position = rng.integers(
+            node.y + min_height, node.y + node.height - min_height, endpoint=True
+        )
+    else:
+        position = rng.integers(
+            node.x + min_width, node.x + node.width - min_width, endpoint=True
+        )
 
-    # Each point has a list of pixels
-    point_pixels = []
-    for i in range(len(points)):
-        point_pixels.append([])
+    node.split_once(horizontal, int(position))
+    for child in node.children:
+        split_recursive(
+            child,
+            rng,
+            depth - 1,
+            min_width,
+            min_height,
+            max_horizontal_ratio,
+            max_vertical_ratio,
+        )
+
+
+@timed_stage("generate_voronoi_regions")
+def generate_voronoi_regions(dungeon: GameMap, rng: np.random.Generator):
+    from scipy import spatial  # Imported here since scipy is slow to load.
+
+    # Randomly generate a list of points
+    point_count = rng.integers(20, 30)
+    points = np.column_stack(
+        (
+            rng.integers(0, dungeon.width - 1, size=point_count),
+            rng.integers(0, dungeon.height - 1, size=point_count),
+        )
+    )
 
     # Build a search tree
     tree = spatial.KDTree(points)
 
-    # build a list of pixed coordinates to query
-    pixel_coordinates = np.zeros((dungeon.height * dungeon.width, 2))
-    i = 0
-    for pixel_y_coordinate in range(dungeon.height):
-        for pixel_x_coordinate in range(dungeon.width):
-            pixel_coordinates[i] = np.array([pixel_x_coordinate, pixel_y_coordinate])
-            i = i + 1
+    # For each floor cell, determine which point it is closest to.
+    floor_cells = np.argwhere(dungeon.tiles == tile_types.floor)
+    distances, indices = tree.query(floor_cells)
+
+    # Group the cells by their closest point, one array of cells per point.
+    order = np.argsort(indices, kind="stable")
+    counts = np.bincount(indices, minlength=point_count)
+    return np.split(floor_cells[order], np.cumsum(counts)[:-1])
+
+
+@timed_stage("label_regions")
+def label_regions(walkable: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Label the separate regions of `walkable`, moving only between cardinal
+    neighbors, the same as the Dijkstra maps used for finding the exit.
+
+    Returns the label of every cell, 0 for cells which aren't walkable, the size of
+    each region, and a representative cell of each region.  The representative is
+    the cell closest to the regions center which is inside the region, unlike the
+    center itself.  The sizes and cells are in label order, starting at label 1.
+    """
+    from scipy import ndimage  # Imported here since scipy is slow to load.
+
+    labels, region_count = ndimage.label(walkable)
+    cells = np.argwhere(labels)
+    cell_labels = labels[cells[:, 0], cells[:, 1]]
+
+    sizes = np.bincount(cell_labels, minlength=region_count + 1)[1:]
+    centers = (
+        np.column_stack(
+            [
+                np.bincount(
+                    cell_labels, weights=cells[:, axis], minlength=region_count + 1
+                )[1:]
+                for axis in (0, 1)
+            ]
+        )
+        / np.maximum(sizes, 1)[:, np.newaxis]
+    )
+
+    # Sort the cells by label, then by distance from their regions center, and
+    # take the first cell of each label.
+    offsets = cells - centers[cell_labels - 1]
+    distances = np.einsum("ij,ij->i", offsets, offsets)
+    order = np.lexsort((distances, cell_labels))
+    first = np.flatnonzero(np.diff(cell_labels[order], prepend=0))
+    representatives = cells[order[first]]
 
-    # for each pixel within bounds, determine which point it is closest to and add it to the corresponding list in point_pixels
-    [distances, indices] = tree.query(pixel_coordinates)
+    return labels, sizes, representatives
 
-    i = 0
-    for pixel_y_coordinate in range(dungeon.height):
-        for pixel_x_coordinate in range(dungeon.width):
-            if (
-                dungeon.tiles[pixel_x_coordinate, pixel_y_coordinate]
-                == tile_types.floor
-            ):
-                point_pixels[indices[i]].append(
-                    (pixel_x_coordinate, pixel_y_coordinate)
-                )
-                i = i + 1
 
-    return point_pixels
+def spanning_tree_edges(points: np.ndarray) -> np.ndarray:
+    """Return the pairs of indexes of `points` which form their Euclidean minimum
+    spanning tree.
+    """
+    from scipy import sparse, spatial
 
+    if len(points) < 2:
+        return np.zeros((0, 2), dtype=np.intp)
 
+    # The minimum spanning tree only uses edges of the Delaunay triangulation,
+    # which is far smaller than the full graph once there are many regions.
+    try:
+        triangles = spatial.Delaunay(points).simplices
+        pairs = np.concatenate(
+            [triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [0, 2]]]
+        )
+    except (spatial.QhullError, ValueError):
+        # Too few points, or all on a line.
+        pairs = np.argwhere(np.triu(np.ones((len(points), len(points)), dtype=bool), 1))
+
+    lengths = np.hypot(*(points[pairs[:, 0]] - points[pairs[:, 1]]).T)
+    graph = sparse.coo_matrix(
+        # Points on top of each other must still count as an edge.
+        (lengths + 1e-6, (pairs[:, 0], pairs[:, 1])),
+        shape=(len(points), len(points)),
+    )
+    tree = sparse.csgraph.minimum_spanning_tree(graph).tocoo()
+    return np.column_stack((tree.row, tree.col))
+
+
+@timed_stage("connect_regions")
+def connect_regions(
+    dungeon: GameMap, rng: np.random.Generator, min_size: int = 1
+) -> Tuple[int, int]:
+    """
+    Make all floor of `dungeon` reachable, by digging tunnels along the minimum
+    spanning tree of its regions.
+
+    Regions smaller than `min_size` are filled in rather than connected, unless
+    that would leave no floor at all.  Returns the representative cell of the
+    largest region, a good place to start from.
+    """
+    labels, sizes, representatives = label_regions(dungeon.tiles["walkable"])
+    if len(sizes) == 0:
+        raise ValueError("The map has no floor to connect.")
+
+    small = sizes < min_size
+    if small.all():
+        small[:] = False
+    if small.any():
+        dungeon.tiles[np.isin(labels, np.flatnonzero(small) + 1)] = tile_types.wall
+    sizes = sizes[~small]
+    representatives = representatives[~small]
+
+    for a, b in spanning_tree_edges(representatives):
+        for x, y in tunnel_between(
+            tuple(representatives[a]), tuple(representatives[b]), rng
+        ):
+            dungeon.tiles[x, y] = tile_types.floor
+
+    x, y = representatives[np.argmax(sizes)]
+    return int(x), int(y)
+
+
+@timed_stage("generate_dijkstra_map")
 def generate_dijkstra_map(dungeon: GameMap, point: Tuple[int, int]):
     cost = np.where(dungeon.tiles == tile_types.floor, 1, 0)
 
@@ -133,22 +267,20 @@ def generate_dijkstra_map(dungeon: GameMap, point: Tuple[int, int]):
     return dist
 
 
+@timed_stage("exit_from_dijk")
 def exit_from_dijk(dungeon: GameMap, dijk_map, cull_unreachable=False):
-    exit_tile = ((0, 0), 0.0)
-
-    for y in range(0, dungeon.height):
-        for x in range(0, dungeon.width):
-            if dungeon.tiles[x, y] == tile_types.floor:
-                dist_to_start = dijk_map[x, y]
+    is_floor = dungeon.tiles == tile_types.floor
+    unreachable = dijk_map == np.iinfo(np.int32).max
 
-                if dist_to_start == np.iinfo(np.int32).max:
-                    if cull_unreachable:
-                        dungeon.tiles[x, y] = tile_types.wall
-                else:
-                    if dist_to_start > exit_tile[1]:
-                        exit_tile = ((x, y), dist_to_start)
+    if cull_unreachable:
+        dungeon.tiles[is_floor & unreachable] = tile_types.wall
 
-    return exit_tile[0]
+    # The furthest reachable floor, taking the first in row order on ties.
+    distances = np.where(is_floor & ~unreachable, dijk_map, 0).T
+    y, x = np.unravel_index(np.argmax(distances), distances.shape)
+    if distances[y, x] == 0:
+        return (0, 0)
+    return (int(x), int(y))
 
 
 def place_entities(
@@ -156,28 +288,82 @@ def place_entities(
     dungeon: GameMap,
     floor_number: int,
 ) -> None:
+    place_entities_in_regions([cells], dungeon, floor_number)
 
-    number_of_monsters = dungeon.engine.rng.integers(
-        0, get_max_value_for_floor(max_monsters_by_floor, floor_number), endpoint=True
+
+@timed_stage("place_entities")
+def place_entities_in_regions(
+    regions,
+    dungeon: GameMap,
+    floor_number: int,
+) -> None:
+    """
+    Place a random number of monsters and items in each region.
+    The spawns for every region are drawn together, in one call for each table,
+    and each is given its own free cell so that none are lost to collisions.
+    """
+    rng = dungeon.engine.rng_streams.loot(floor_number)
+    regions = [cells for cells in regions if len(cells) > 0]
+
+    monster_counts = rng.integers(
+        0,
+        get_max_value_for_floor(max_monsters_by_floor, floor_number),
+        size=len(regions),
+        endpoint=True,
     )
-    number_of_items = dungeon.engine.rng.integers(
-        0, get_max_value_for_floor(max_items_by_floor, floor_number), endpoint=True
+    item_counts = rng.integers(
+        0,
+        get_max_value_for_floor(max_items_by_floor, floor_number),
+        size=len(regions),
+        endpoint=True,
     )
 
-    monsters: List[Entity] = get_entities_at_random(
-        enemy_chances, number_of_monsters, dungeon, floor_number
+    monster_table = enemy_spawn_table.for_floor(floor_number)
+    item_table = item_spawn_table.for_floor(floor_number)
+
+    # Draw every regions spawns at once, then split them back up by region.
+    monster_indexes = np.split(
+        monster_table.sample(rng, monster_counts.sum()), np.cumsum(monster_counts)[:-1]
     )
-    items: List[Entity] = get_entities_at_random(
-        item_chances, number_of_items, dungeon, floor_number
+    item_indexes = np.split(
+        item_table.sample(rng, item_counts.sum()), np.cumsum(item_counts)[:-1]
     )
 
-    for entity in monsters + items:
-        x, y = dungeon.engine.rng.choice(cells)
+    # Cells which already hold an entity, so nothing is spawned on top of another.
+    occupied = np.zeros((dungeon.width, dungeon.height), dtype=bool)
+    for entity in dungeon.entities:
+        occupied[entity.x, entity.y] = True
 
-        if not any(entity.x == x and entity.y == y for entity in dungeon.entities):
+    for cells, monsters, items in zip(regions, monster_indexes, item_indexes):
+        entities: List[Entity] = [monster_table.entities[i] for i in monsters]
+        entities += [item_table.entities[i] for i in items]
+        if not entities:
+            continue
+
+        for entity, (x, y) in zip(
+            entities, sample_free_cells(cells, occupied, rng, len(entities)).tolist()
+        ):
             entity.spawn(dungeon, x, y)
 
 
+def sample_free_cells(
+    cells, occupied: np.ndarray, rng: np.random.Generator, count: int
+) -> np.ndarray:
+    """
+    Return up to `count` distinct cells from `cells` which aren't `occupied`,
+    and mark them as occupied.
+
+    Fewer than `count` cells are only returned if there aren't enough free cells.
+    """
+    cells = np.asarray(cells, dtype=np.intp).reshape(-1, 2)
+    free = cells[~occupied[cells[:, 0], cells[:, 1]]]
+
+    chosen = free[rng.choice(len(free), size=min(count, len(free)), replace=False)]
+    occupied[chosen[:, 0], chosen[:, 1]] = True
+
+    return chosen
+
+
 def get_max_value_for_floor(
     max_value_by_floor: List[Tuple[int, int]], floor: int
 ) -> int:
@@ -190,34 +376,3 @@ def get_max_value_for_floor(
             current_value = value
 
     return current_value
-
-
-def get_entities_at_random(
-    weighted_chances_by_floor: Dict[int, List[Tuple[Entity, int]]],
-    number_of_entities: int,
-    dungeon: GameMap,
-    floor: int,
-) -> List[Entity]:
-    entity_weighted_chances = {}
-
-    for key, values in weighted_chances_by_floor.items():
-        if key > floor:
-            break
-        else:
-            for value in values:
-                entity = value[0]
-                weighted_chance = value[1]
-
-                entity_weighted_chances[entity] = weighted_chance
-
-    entities = list(entity_weighted_chances.keys())
-    entity_weighted_chance_values = list(entity_weighted_chances.values())
-    normalized_weights = entity_weighted_chance_values / np.linalg.norm(
-        entity_weighted_chance_values
-    )
-
-    chosen_entities = dungeon.engine.rng.choice(
-        entities, p=normalized_weights, size=number_of_entities
-    )
-
-    return chosen_entities.tolist()
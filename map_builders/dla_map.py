@@ -1,10 +1,11 @@
+from typing import Callable
 from enum import Enum
 import numpy as np
 
 from map_builders.map_builder import MapBuilder
 from map_builders.common import (
     exit_from_dijk,
-    place_entities,
+    place_entities_in_regions,
     generate_voronoi_regions,
     generate_dijkstra_map,
 )
@@ -48,7 +49,7 @@ class DLAMapBuilder(MapBuilder):
         )
 
     def build(self) -> GameMap:
-        self.algorithm = self.engine.rng.choice(Algorithm)
+        self.algorithm = self.rng.choice(Algorithm)
         self.algorithm = Algorithm.WALK_INWARDS
         self.floor_percent = 0.25
         dungeon = self.build_map()
@@ -68,7 +69,7 @@ class DLAMapBuilder(MapBuilder):
         total_tiles = self.map_width * self.map_height
         desired_tiles = int(total_tiles * self.floor_percent)
 
-        dla = DLA(self.map_width, self.map_height, 1)
+        dla = DLA(self.map_width, self.map_height, 1, self.rng, self.report_progress)
         dla.addPoint(desired_tiles)
 
         dungeon.tiles = np.where(dla.state, tile_types.floor, tile_types.wall)
@@ -79,17 +80,26 @@ class DLAMapBuilder(MapBuilder):
         dungeon.tiles[exit_tile] = tile_types.down_stairs
         dungeon.downstairs = exit_tile
 
-        regions = generate_voronoi_regions(dungeon)
+        regions = generate_voronoi_regions(dungeon, self.rng)
 
-        for region in regions:
-            if len(region) > 0:
-                place_entities(region, dungeon, self.engine.game_world.current_floor)
+        place_entities_in_regions(
+            regions, dungeon, self.engine.game_world.current_floor
+        )
 
         return dungeon
 
 
 class DLA:
-    def __init__(self, width, height, k):
+    def __init__(
+        self,
+        width,
+        height,
+        k,
+        rng: np.random.Generator,
+        report_progress: Callable[..., None],
+    ):
+        self.rng = rng
+        self.report_progress = report_progress
         self.width = width
         self.height = height
         self.state = np.zeros((width, height), dtype=int)
@@ -112,7 +122,7 @@ class DLA:
         """
 
         boundingCircle = self.getBoundingCircle()
-        p = np.random.randint(len(boundingCircle))
+        p = self.rng.integers(len(boundingCircle))
 
         return boundingCircle[p]
 
@@ -238,7 +248,7 @@ class DLA:
         adjacentPoints = self.getAdjacentPoints(curr)
         return (
             any(map(lambda x: self.state[x] == 1, adjacentPoints))
-            and np.random.rand() < self.k
+            and self.rng.random() < self.k
         )
 
     def getNextPosition(self, curr):
@@ -253,7 +263,7 @@ class DLA:
 
         adjacentPoints = self.getAdjacentPoints(curr)  # List of adjacent points
         adjacentPoints = list(filter(lambda x: self.state[x] == 0, adjacentPoints))
-        s = np.random.randint(len(adjacentPoints))  # Get random point
+        s = self.rng.integers(len(adjacentPoints))  # Get random point
         return adjacentPoints[s]
 
     def getSurfaceArea(self):
@@ -295,15 +305,23 @@ class DLA:
         """
 
         floor_number = np.count_nonzero(self.state)
+        # Steps wandered since progress was last reported.
+        steps = 0
 
         while floor_number < desired_tiles:
 
-            if (floor_number + 1) % 100 == 0:
-                print(f"{floor_number}/{desired_tiles}")
+            # The particle itself counts as a step too.
+            self.report_progress(floor_number / desired_tiles, steps=steps + 1)
+            steps = 0
 
             curr = self.getSeed()  # Get initial position
 
             while not self.checkIfTerminate(curr):
+                # A particle can wander for a long time before it sticks.
+                steps += 1
+                if steps == 1000:
+                    self.report_progress(floor_number / desired_tiles, steps=steps)
+                    steps = 0
                 curr = self.getNextPosition(curr)
                 if (curr[0] - self.xcenter) ** 2 + (curr[1] - self.ycenter) ** 2 > (
                     self.radius + 15
@@ -1,9 +1,11 @@
 from enum import Enum
 
+import numpy as np  # type: ignore
+
 from map_builders.map_builder import MapBuilder
 from map_builders.common import (
     exit_from_dijk,
-    place_entities,
+    place_entities_in_regions,
     generate_voronoi_regions,
     generate_dijkstra_map,
 )
@@ -40,7 +42,7 @@ class DrunkenMapBuilder(MapBuilder):
         )
 
     def build(self) -> GameMap:
-        generation = self.engine.rng.choice(Generation)
+        generation = self.rng.choice(Generation)
         if generation == Generation.OPEN_AREA:
             self.spawn_mode = "Start"
             self.drunk_life = 400
@@ -72,14 +74,10 @@ class DrunkenMapBuilder(MapBuilder):
         desired_tiles = int(total_tiles * self.floor_percent)
         digger_count = 0
 
-        floor_number = len(
-            [
-                (x, y)
-                for x in range(0, self.map_width - 1)
-                for y in range(0, self.map_height - 1)
-                if dungeon.tiles[x, y] == tile_types.floor
-            ]
-        )
+        # Dig into a plain boolean grid, which is much quicker to read and write
+        # one cell at a time than the tile array.
+        is_floor = dungeon.tiles == tile_types.floor
+        floor_number = int(np.count_nonzero(is_floor[:-1, :-1]))
 
         while floor_number < desired_tiles:
             if self.spawn_mode == "Random":
@@ -87,18 +85,22 @@ class DrunkenMapBuilder(MapBuilder):
                     drunk_x = start_pos[0]
                     drunk_y = start_pos[1]
                 else:
-                    drunk_x = self.engine.rng.integers(1, self.map_width - 1)
-                    drunk_y = self.engine.rng.integers(1, self.map_height - 1)
+                    drunk_x = self.rng.integers(1, self.map_width - 1)
+                    drunk_y = self.rng.integers(1, self.map_height - 1)
             else:
                 drunk_x = start_pos[0]
                 drunk_y = start_pos[1]
 
             drunk_life = 400
+            self.report_progress(floor_number / desired_tiles, steps=drunk_life)
+            stagger_directions = self.rng.integers(0, 4, size=drunk_life).tolist()
 
             while drunk_life > 0:
-                dungeon.tiles[drunk_x, drunk_y] = tile_types.floor
+                if not is_floor[drunk_x, drunk_y]:
+                    is_floor[drunk_x, drunk_y] = True
+                    floor_number += 1
 
-                stagger_direction = self.engine.rng.integers(0, 4)
+                stagger_direction = stagger_directions[drunk_life - 1]
                 if stagger_direction == 0 and drunk_x > 1:
                     drunk_x -= 1
                 elif stagger_direction == 1 and drunk_x < self.map_width - 2:
@@ -111,14 +113,8 @@ class DrunkenMapBuilder(MapBuilder):
                 drunk_life -= 1
 
             digger_count += 1
-            floor_number = len(
-                [
-                    (x, y)
-                    for x in range(0, self.map_width - 1)
-                    for y in range(0, self.map_height - 1)
-                    if dungeon.tiles[x, y] == tile_types.floor
-                ]
-            )
+
+        dungeon.tiles[is_floor] = tile_types.floor
 
         dijk_map = generate_dijkstra_map(dungeon, (player.x, player.y))
         exit_tile = exit_from_dijk(dungeon, dijk_map, cull_unreachable=True)
@@ -126,10 +122,10 @@ class DrunkenMapBuilder(MapBuilder):
         dungeon.tiles[exit_tile] = tile_types.down_stairs
         dungeon.downstairs = exit_tile
 
-        regions = generate_voronoi_regions(dungeon)
+        regions = generate_voronoi_regions(dungeon, self.rng)
 
-        for region in regions:
-            if len(region) > 0:
-                place_entities(region, dungeon, self.engine.game_world.current_floor)
+        place_entities_in_regions(
+            regions, dungeon, self.engine.game_world.current_floor
+        )
 
         return dungeon
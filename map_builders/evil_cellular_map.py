@@ -1,15 +1,10 @@
 from typing import List
-from scipy.ndimage.measurements import label
-
-from tcod.event import wait
-
 from map_builders.map_builder import MapBuilder
-from map_builders.common import RectangularRoom, tunnel_between, place_entities
+from map_builders.common import RectangularRoom, connect_regions, place_entities
 
 from game_map import GameMap
 import tile_types
 import numpy as np
-from scipy import ndimage
 
 from engine import Engine
 
@@ -42,58 +37,36 @@ class EvilCellularMapBuilder(MapBuilder):
 
         rooms: List[RectangularRoom] = []
 
-        dungeon.tiles = self.engine.rng.choice(
+        dungeon.tiles = self.rng.choice(
             [tile_types.wall, tile_types.floor],
             size=(self.map_width, self.map_height),
             p=[0.6, 0.4],
         )
 
-        for y in range(0, self.map_height):
-            for x in range(0, self.map_width):
-                if x < 2 or x > self.map_width - 3 or y < 2 or y > self.map_height - 3:
-                    dungeon.tiles[x, y] = tile_types.wall
+        border = np.ones((self.map_width, self.map_height), dtype=np.bool_)
+        border[2:-2, 2:-2] = False
+        dungeon.tiles[border] = tile_types.wall
 
         for i in range(0, 10):
-            new_tiles = dungeon.tiles.copy()
+            self.report_progress(i / 10)
+            is_wall = dungeon.tiles == tile_types.wall
+            neighbors = self.count_adjacent_walls(is_wall)
 
-            for y in range(1, self.map_height - 1):
-                for x in range(1, self.map_width - 1):
-                    neighbors = self.getAdjacentWalls(x, y, dungeon)
+            dungeon.tiles[1:-1, 1:-1] = np.where(
+                (neighbors > 4) | (neighbors == 0), tile_types.wall, tile_types.floor
+            )
 
-                    if neighbors > 4 or neighbors == 0:
-                        new_tiles[x, y] = tile_types.wall
-                    else:
-                        new_tiles[x, y] = tile_types.floor
-            dungeon.tiles = new_tiles.copy()
-
-        for y in range(0, self.map_height - 1):
-            for x in range(0, self.map_width - 1):
-                if x < 2 or x > self.map_width - 3 or y < 2 or y > self.map_height - 3:
-                    dungeon.tiles[x, y] = tile_types.wall
+        dungeon.tiles[border] = tile_types.wall
 
         self.cleanup(dungeon, 1)
 
-        bool = dungeon.tiles == tile_types.floor
-
         # Find and connect each blob
-        labels, nlabels = ndimage.label(bool)
-        r, c = np.vstack(ndimage.center_of_mass(bool, labels, np.arange(nlabels) + 1)).T
-
-        for i in range(1, len(r)):
-            for x, y in tunnel_between(
-                [int(r[i]), int(c[i])], [int(r[i - 1]), int(c[i - 1])], dungeon
-            ):
-                dungeon.tiles[x, y] = tile_types.floor
-
-        cells = [
-            (x, y)
-            for x in range(0, self.map_width - 1)
-            for y in range(0, self.map_height - 1)
-            if dungeon.tiles[x, y] == tile_types.floor
-        ]
+        start = connect_regions(dungeon, self.rng)
 
-        place_entities(cells, dungeon, self.engine.game_world.current_floor)
+        player.place(*start, dungeon)
+
+        cells = np.argwhere(dungeon.tiles[:-1, :-1] == tile_types.floor)
 
-        player.place(int(r[0]), int(c[0]), dungeon)
+        place_entities(cells, dungeon, self.engine.game_world.current_floor)
 
         return dungeon
@@ -1,6 +1,12 @@
+from typing import Callable, Optional
+
+import numpy as np  # type: ignore
+
 from game_map import GameMap
 from entity import Entity
 from engine import Engine
+import exceptions
+from map_builders.stage_timer import StageTimer
 import tile_types
 
 
@@ -20,6 +26,17 @@ class MapBuilder:
         self.map_width = map_width
         self.map_height = map_height
         self.engine = engine
+        # Every random draw made while building comes from this floor's stream.
+        self.rng: np.random.Generator = engine.rng_streams.mapgen(
+            engine.game_world.current_floor
+        )
+        self.stage_timer = StageTimer()
+        # How many steps the build may take, if it is limited, and has taken.
+        self.step_budget: Optional[int] = None
+        self.steps = 0
+        # Called with the fraction of the build done, whenever it is reported.
+        self.progress_callback: Optional[Callable[[float], None]] = None
+        self.progress = 0.0
 
     def build(self) -> GameMap:
         """
@@ -28,38 +45,94 @@ class MapBuilder:
         """
         raise NotImplementedError()
 
+    def generate(self) -> GameMap:
+        """
+        Build a new GameMap, timing each stage if the stage timer is enabled.
+        Time not spent inside one of the shared helpers is counted as "carve".
+        """
+        self.stage_timer.reset()
+        self.steps = 0
+        self.report_progress(0.0)
+        with self.stage_timer.activate(), self.stage("carve"):
+            dungeon = self.build()
+        self.progress = 1.0
+        if self.progress_callback is not None:
+            self.progress_callback(1.0)
+        return dungeon
+
+    def report_progress(self, fraction: float, steps: int = 0) -> None:
+        """
+        Record how much of the build is done, from 0 to 1, and add `steps` to the
+        steps the build has taken.
+
+        Builders call this regularly from any loop which can run for a while, and
+        count one step for each pass of a loop whose length isn't fixed.  Once the
+        build has taken more than `step_budget` steps it raises BuildTimeout, which
+        abandons the build.  Steps are counted rather than timed, so a build is
+        abandoned at the same point on any machine and seeded games stay the same.
+        """
+        self.progress = fraction
+        self.steps += steps
+        if self.progress_callback is not None:
+            self.progress_callback(fraction)
+        if self.step_budget is not None and self.steps > self.step_budget:
+            raise exceptions.BuildTimeout(
+                f"{type(self).__name__} went over {self.step_budget} steps"
+                f" at {fraction:.0%} done."
+            )
+
+    def stage(self, name: str):
+        """Time a section of a build as its own stage."""
+        return self.stage_timer.stage(name)
+
     def cleanup(self, dungeon: GameMap, smoothing: int):
+        """
+        Turn walls which have at most `smoothing` walls next to them into floor,
+        in five passes over the map.
+
+        Each pass looks at the cells one at a time, by columns, so a wall turned
+        into floor counts as floor for the cells after it in the same pass.  A
+        cell only depends on the cells before it to its left and above it, so the
+        cells on each anti-diagonal are independent, and are updated together.
+        """
+        is_wall = dungeon.tiles == tile_types.wall
+        was_wall = is_wall.copy()
+        width, height = is_wall.shape
+        diagonals = []
+        for d in range(2, width + height - 3):
+            xs = np.arange(max(1, d - (height - 2)), min(width - 2, d - 1) + 1)
+            diagonals.append((xs, d - xs))
+
         for i in range(0, 5):
-            # Look at each cell individually and check for smoothness
-            for x in range(1, dungeon.width - 1):
-                for y in range(1, dungeon.height - 1):
-                    if (dungeon.tiles[x, y] == tile_types.wall) and (
-                        self.getAdjacentWalls(x, y, dungeon, simple=True) <= smoothing
-                    ):
-                        dungeon.tiles[x, y] = tile_types.floor
-
-    def getAdjacentWalls(self, x: int, y: int, dungeon: GameMap, simple=False) -> int:
-        neighbors = 0
-
-        if dungeon.tiles[x - 1, y] == tile_types.wall:
-            neighbors += 1
-        if dungeon.tiles[x + 1, y] == tile_types.wall:
-            neighbors += 1
-        if dungeon.tiles[x, y - 1] == tile_types.wall:
-            neighbors += 1
-        if dungeon.tiles[x, y + 1] == tile_types.wall:
-            neighbors += 1
+            for xs, ys in diagonals:
+                walls = (
+                    is_wall[xs - 1, ys].astype(np.int8)
+                    + is_wall[xs + 1, ys]
+                    + is_wall[xs, ys - 1]
+                    + is_wall[xs, ys + 1]
+                )
+                is_wall[xs, ys] &= walls > smoothing
+
+        dungeon.tiles[was_wall & ~is_wall] = tile_types.floor
+
+    @staticmethod
+    def count_adjacent_walls(is_wall: np.ndarray, simple=False) -> np.ndarray:
+        """
+        Return the number of walls next to every cell which isn't on the edge.
+        Only the four cardinal neighbors are counted if `simple` is True.
+        """
+        walls = is_wall.astype(np.int8)
+        neighbors = (
+            walls[:-2, 1:-1] + walls[2:, 1:-1] + walls[1:-1, :-2] + walls[1:-1, 2:]
+        )
 
         if simple:
             return neighbors
 
-        if dungeon.tiles[x - 1, y - 1] == tile_types.wall:
-            neighbors += 1
-        if dungeon.tiles[x - 1, y + 1] == tile_types.wall:
-            neighbors += 1
-        if dungeon.tiles[x + 1, y - 1] == tile_types.wall:
-            neighbors += 1
-        if dungeon.tiles[x + 1, y + 1] == tile_types.wall:
-            neighbors += 1
-
-        return neighbors
+        return (
+            neighbors
+            + walls[:-2, :-2]
+            + walls[:-2, 2:]
+            + walls[2:, :-2]
+            + walls[2:, 2:]
+        )
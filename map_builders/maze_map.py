@@ -1,10 +1,12 @@
-from dataclasses import dataclass
-from typing import Optional, Tuple
+from math import e
+from typing import List
+
+import numpy as np  # type: ignore
 
 from map_builders.map_builder import MapBuilder
 from map_builders.common import (
     exit_from_dijk,
-    place_entities,
+    place_entities_in_regions,
     generate_voronoi_regions,
     generate_dijkstra_map,
 )
@@ -14,6 +16,16 @@ import tile_types
 
 from engine import Engine
 
+# The states of the cells of the maze field.
+UNKNOWN = 0  # Not looked at yet.
+FRONTIER = 1  # Next to the maze, waiting to be carved or hardened.
+SPACE = 2
+WALL = 3
+BORDER = 4  # Outside of the map, never carved.
+
+# How many random numbers are drawn from the generator at a time.
+RANDOM_BATCH = 4096
+
 
 class MazeMapBuilder(MapBuilder):
     def __init__(
@@ -41,52 +53,51 @@ class MazeMapBuilder(MapBuilder):
             self.engine, self.map_width, self.map_height, entities=[player]
         )
 
-        self.field = []
-
-        for y in range(self.map_height):
-            row = []
-            for x in range(self.map_width):
-                row.append("?")
-            self.field.append(row)
-
-        self.frontier = []
-
-        start_x = self.engine.rng.integers(0, self.map_width)
-        start_y = self.engine.rng.integers(0, self.map_height)
-        self.carve(start_y, start_x)
-
-        branchrate = self.engine.rng.integers(-10, 11)
-
-        from math import e
-
-        while len(self.frontier):
-            # select a random edge
-            pos = self.engine.rng.random()
-            pos = pos ** (e ** -branchrate)
-            choice = self.frontier[int(pos * len(self.frontier))]
-            if self.check(*choice):
-                self.carve(*choice)
+        # The field is a flat grid of cell states with a border of BORDER cells
+        # around it, so looking at a neighbor never needs a bounds check.
+        self.stride = self.map_width + 2
+        self.field = bytearray([BORDER]) * (self.stride * (self.map_height + 2))
+        field = np.frombuffer(self.field, dtype=np.uint8).reshape(
+            self.map_height + 2, self.stride
+        )
+        field[1:-1, 1:-1] = UNKNOWN
+
+        # Cells waiting to be carved or hardened, oldest first, as field indexes.
+        self.frontier: List[int] = []
+        self.shuffle_draws: List[float] = []
+
+        start_x = self.rng.integers(0, self.map_width)
+        start_y = self.rng.integers(0, self.map_height)
+        self.carve(self.index(start_x, start_y))
+
+        branchrate = self.rng.integers(-10, 11)
+        exponent = e**-branchrate
+        edge_draws: List[float] = []
+        # Every cell enters the frontier at most once.
+        cell_count = self.map_width * self.map_height
+        steps = 0
+
+        while self.frontier:
+            # select a random edge, favoring old or new edges depending on branchrate
+            if not edge_draws:
+                self.report_progress(steps / cell_count, steps=RANDOM_BATCH)
+                steps += RANDOM_BATCH
+                edge_draws = (self.rng.random(RANDOM_BATCH) ** exponent).tolist()
+            position = int(edge_draws.pop() * len(self.frontier))
+            choice = self.frontier[position]
+            if self.check(choice):
+                self.carve(choice)
             else:
-                self.harden(*choice)
-            self.frontier.remove(choice)
-
-        # set unexposed cells to be walls
-        for y in range(self.map_height):
-            for x in range(self.map_width):
-                if self.field[y][x] == "?":
-                    self.field[y][x] = "#"
-
-        for y in range(self.map_height):
-            for x in range(self.map_width):
-                if self.field[y][x] == "#":
-                    dungeon.tiles[x, y] = tile_types.wall
-                else:
-                    dungeon.tiles[x, y] = tile_types.floor
-
-        for y in range(0, self.map_height):
-            for x in range(0, self.map_width):
-                if x < 1 or x > self.map_width - 2 or y < 1 or y > self.map_height - 2:
-                    dungeon.tiles[x, y] = tile_types.wall
+                self.field[choice] = WALL
+            # Deleting by position keeps the frontier in order, which branchrate
+            # depends on.  It is a single memory move, unlike searching with remove.
+            del self.frontier[position]
+
+        # Every cell which isn't a space, including ones never reached, is a wall.
+        is_space = field[1:-1, 1:-1].T == SPACE
+        is_space[[0, -1], :] = False
+        is_space[:, [0, -1]] = False
+        dungeon.tiles[:] = np.where(is_space, tile_types.floor, tile_types.wall)
 
         player.place(start_x, start_y, dungeon)
 
@@ -96,104 +107,65 @@ class MazeMapBuilder(MapBuilder):
         dungeon.tiles[exit_tile] = tile_types.down_stairs
         dungeon.downstairs = exit_tile
 
-        regions = generate_voronoi_regions(dungeon)
+        regions = generate_voronoi_regions(dungeon, self.rng)
 
-        for region in regions:
-            if len(region) > 0:
-                place_entities(region, dungeon, self.engine.game_world.current_floor)
+        place_entities_in_regions(
+            regions, dungeon, self.engine.game_world.current_floor
+        )
 
         return dungeon
 
-    def carve(self, y, x):
+    def index(self, x: int, y: int) -> int:
+        """Return the field index of the map position (x, y)."""
+        return (y + 1) * self.stride + x + 1
+
+    def carve(self, i: int) -> None:
+        """Make the cell at field index i a space, and add its unknown neighbors
+        to the frontier in a random order.
+        """
+        field = self.field
+        field[i] = SPACE
         extra = []
-        self.field[y][x] = "."
-        if x > 0:
-            if self.field[y][x - 1] == "?":
-                self.field[y][x - 1] = ","
-                extra.append((y, x - 1))
-        if x < self.map_width - 1:
-            if self.field[y][x + 1] == "?":
-                self.field[y][x + 1] = ","
-                extra.append((y, x + 1))
-        if y > 0:
-            if self.field[y - 1][x] == "?":
-                self.field[y - 1][x] = ","
-                extra.append((y - 1, x))
-        if y < self.map_height - 1:
-            if self.field[y + 1][x] == "?":
-                self.field[y + 1][x] = ","
-                extra.append((y + 1, x))
-        self.engine.rng.shuffle(extra)
+        for neighbor in (i - 1, i + 1, i - self.stride, i + self.stride):
+            if field[neighbor] == UNKNOWN:
+                field[neighbor] = FRONTIER
+                extra.append(neighbor)
+
+        # Fisher-Yates shuffle using pre-drawn numbers.
+        for j in range(len(extra) - 1, 0, -1):
+            if not self.shuffle_draws:
+                self.shuffle_draws = self.rng.random(RANDOM_BATCH).tolist()
+            k = int(self.shuffle_draws.pop() * (j + 1))
+            extra[j], extra[k] = extra[k], extra[j]
         self.frontier.extend(extra)
 
-    def harden(self, y, x):
-        """Make the cell at y,x a wall."""
-        self.field[y][x] = "#"
-
-    def check(self, y, x, nodiagonals=True):
-        """Test the cell at y,x: can this cell become a space?
+    def check(self, i: int) -> bool:
+        """Test the cell at field index i: can this cell become a space?
 
         True indicates it should become a space,
         False indicates it should become a wall.
+        Cells which would make a diagonal connection are walls, since the mazes
+        look better without them.
         """
+        field = self.field
+        stride = self.stride
 
         edgestate = 0
-        if x > 0:
-            if self.field[y][x - 1] == ".":
-                edgestate += 1
-        if x < self.map_width - 1:
-            if self.field[y][x + 1] == ".":
-                edgestate += 2
-        if y > 0:
-            if self.field[y - 1][x] == ".":
-                edgestate += 4
-        if y < self.map_height - 1:
-            if self.field[y + 1][x] == ".":
-                edgestate += 8
-
-        if nodiagonals:
-            # if this would make a diagonal connecition, forbid it
-            # the following steps make the test a bit more complicated and are not necessary,
-            # but without them the mazes don't look as good
-            if edgestate == 1:
-                if x < self.map_width - 1:
-                    if y > 0:
-                        if self.field[y - 1][x + 1] == ".":
-                            return False
-                    if y < self.map_height - 1:
-                        if self.field[y + 1][x + 1] == ".":
-                            return False
-                return True
-            elif edgestate == 2:
-                if x > 0:
-                    if y > 0:
-                        if self.field[y - 1][x - 1] == ".":
-                            return False
-                    if y < self.map_height - 1:
-                        if self.field[y + 1][x - 1] == ".":
-                            return False
-                return True
-            elif edgestate == 4:
-                if y < self.map_height - 1:
-                    if x > 0:
-                        if self.field[y + 1][x - 1] == ".":
-                            return False
-                    if x < self.map_width - 1:
-                        if self.field[y + 1][x + 1] == ".":
-                            return False
-                return True
-            elif edgestate == 8:
-                if y > 0:
-                    if x > 0:
-                        if self.field[y - 1][x - 1] == ".":
-                            return False
-                    if x < self.map_width - 1:
-                        if self.field[y - 1][x + 1] == ".":
-                            return False
-                return True
-            return False
-        else:
-            # diagonal walls are permitted
-            if [1, 2, 4, 8].count(edgestate):
-                return True
-            return False
+        if field[i - 1] == SPACE:
+            edgestate += 1
+        if field[i + 1] == SPACE:
+            edgestate += 2
+        if field[i - stride] == SPACE:
+            edgestate += 4
+        if field[i + stride] == SPACE:
+            edgestate += 8
+
+        if edgestate == 1:
+            return field[i - stride + 1] != SPACE and field[i + stride + 1] != SPACE
+        elif edgestate == 2:
+            return field[i - stride - 1] != SPACE and field[i + stride - 1] != SPACE
+        elif edgestate == 4:
+            return field[i + stride - 1] != SPACE and field[i + stride + 1] != SPACE
+        elif edgestate == 8:
+            return field[i - stride - 1] != SPACE and field[i - stride + 1] != SPACE
+        return False
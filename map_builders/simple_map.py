@@ -1,7 +1,11 @@
 from typing import List
 
 from map_builders.map_builder import MapBuilder
-from map_builders.common import RectangularRoom, tunnel_between, place_entities
+from map_builders.common import (
+    RectangularRoom,
+    tunnel_between,
+    place_entities_in_regions,
+)
 
 from game_map import GameMap
 import tile_types
@@ -39,15 +43,11 @@ class SimpleMapBuilder(MapBuilder):
         rooms: List[RectangularRoom] = []
 
         for r in range(self.max_rooms):
-            room_width = self.engine.rng.integers(
-                self.room_min_size, self.room_max_size
-            )
-            room_height = self.engine.rng.integers(
-                self.room_min_size, self.room_max_size
-            )
+            room_width = self.rng.integers(self.room_min_size, self.room_max_size)
+            room_height = self.rng.integers(self.room_min_size, self.room_max_size)
 
-            x = self.engine.rng.integers(0, dungeon.width - room_width - 1)
-            y = self.engine.rng.integers(0, dungeon.height - room_height - 1)
+            x = self.rng.integers(0, dungeon.width - room_width - 1)
+            y = self.rng.integers(0, dungeon.height - room_height - 1)
 
             # "RectangularRoom" class makes rectangles easier to work with
             new_room = RectangularRoom(x, y, room_width, room_height)
@@ -65,14 +65,16 @@ class SimpleMapBuilder(MapBuilder):
                 player.place(*new_room.center, dungeon)
             else:  # All rooms after the first.
                 # Dig out a tunnel between this room and the previous one.
-                for x, y in tunnel_between(rooms[-1].center, new_room.center, dungeon):
+                for x, y in tunnel_between(rooms[-1].center, new_room.center, self.rng):
                     dungeon.tiles[x, y] = tile_types.floor
 
-            place_entities(
-                new_room.cells, dungeon, self.engine.game_world.current_floor
-            )
-
             # Finally, append the new room to the list.
             rooms.append(new_room)
 
+        place_entities_in_regions(
+            [room.cells for room in rooms],
+            dungeon,
+            self.engine.game_world.current_floor,
+        )
+
         return dungeon
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import functools
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+F = TypeVar("F", bound=Callable)
+
+# Returned instead of a timing context when profiling is off, so it costs nothing.
+_NULL_STAGE = nullcontext()
+
+# The timer of the builder which is currently running, if any.
+_active_timer: Optional[StageTimer] = None
+
+
+class StageTimer:
+    """
+    Records how long each stage of a floor build takes.
+
+    Stages can be nested, the time spent in a nested stage is only counted
+    towards that stage and not towards the stage it was entered from.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.timings: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self._stack: List[Tuple[str, float]] = []
+
+    @property
+    def total(self) -> float:
+        return sum(self.timings.values())
+
+    def reset(self) -> None:
+        self.timings.clear()
+        self.calls.clear()
+        self._stack.clear()
+
+    def stage(self, name: str):
+        """Return a context which times everything inside it as `name`."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str) -> Iterator[None]:
+        now = time.perf_counter()
+        if self._stack:
+            # Pause the outer stage.
+            outer_name, outer_start = self._stack[-1]
+            self._add(outer_name, now - outer_start)
+        self._stack.append((name, now))
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            _, start = self._stack.pop()
+            self._add(name, now - start)
+            if self._stack:
+                # Resume the outer stage.
+                outer_name, _ = self._stack[-1]
+                self._stack[-1] = (outer_name, now)
+
+    def _add(self, name: str, seconds: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    @contextmanager
+    def activate(self) -> Iterator[StageTimer]:
+        """Make this the timer which `stage` and `timed_stage` report into."""
+        global _active_timer
+        previous = _active_timer
+        _active_timer = self
+        try:
+            yield self
+        finally:
+            _active_timer = previous
+
+    def summary(self) -> str:
+        stages = sorted(self.timings.items(), key=lambda item: -item[1])
+        return ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in stages)
+
+
+def stage(name: str):
+    """Time a stage against the active timer.  Does nothing if there isn't one."""
+    timer = _active_timer
+    if timer is None or not timer.enabled:
+        return _NULL_STAGE
+    return timer._timed(name)
+
+
+def timed_stage(name: str) -> Callable[[F], F]:
+    """Decorate a function so its calls are timed as the stage `name`."""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timer = _active_timer
+            if timer is None or not timer.enabled:
+                return func(*args, **kwargs)
+            with timer._timed(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+# A part of the map as (left, top, right, bottom), with right and bottom exclusive.
+Rect = Tuple[int, int, int, int]
+
+
+class MapChanges:
+    """
+    Version counters for the parts of a GameMap which caches are built from.
+
+    Every counter only ever goes up.  A cache remembers the versions it was built
+    at, and is stale once one of them has moved on:
+
+    - `tiles` goes up whenever any tile is replaced.
+    - `walkable` and `transparent` only go up when a replaced tile differs in
+      that property, so path and FOV caches aren't thrown away over cosmetic
+      changes.
+    - `positions` goes up whenever an entity moves, dies, or is added or removed.
+
+    When `collect_dirty` is set, the area of every change is also added to
+    `dirty_rect` until it is taken with `take_dirty_rect`.
+    """
+
+    __slots__ = (
+        "tiles",
+        "walkable",
+        "transparent",
+        "positions",
+        "collect_dirty",
+        "dirty_rect",
+    )
+
+    def __init__(self) -> None:
+        self.tiles = 0
+        self.walkable = 0
+        self.transparent = 0
+        self.positions = 0
+        self.collect_dirty = False
+        self.dirty_rect: Optional[Rect] = None
+
+    def mark_dirty(self, rect: Rect) -> None:
+        """Add `rect` to the dirty rect, if dirty rects are being collected."""
+        if not self.collect_dirty:
+            return
+        if self.dirty_rect is None:
+            self.dirty_rect = rect
+            return
+        left, top, right, bottom = self.dirty_rect
+        self.dirty_rect = (
+            min(left, rect[0]),
+            min(top, rect[1]),
+            max(right, rect[2]),
+            max(bottom, rect[3]),
+        )
+
+    def take_dirty_rect(self) -> Optional[Rect]:
+        """Return the area changed since the last call, or None if nothing was."""
+        rect, self.dirty_rect = self.dirty_rect, None
+        return rect
+
+    def tiles_changed(
+        self, rect: Optional[Rect], walkable: bool, transparent: bool
+    ) -> None:
+        """Note that the tiles in `rect` were replaced."""
+        self.tiles += 1
+        self.walkable += walkable
+        self.transparent += transparent
+        if rect is not None:
+            self.mark_dirty(rect)
+
+    def entity_changed(self, x: int, y: int) -> None:
+        """Note that what stands at (x, y) has changed."""
+        self.positions += 1
+        self.mark_dirty((x, y, x + 1, y + 1))
@@ -7,6 +7,8 @@ import color
 
 
 class Message:
+    __slots__ = ("plain_text", "fg", "count")
+
     def __init__(self, text: str, fg: Tuple[int, int, int]):
         self.plain_text = text
         self.fg = fg
@@ -0,0 +1,107 @@
+"""Timing of the phases of a game turn, for finding where a turn's time goes."""
+from __future__ import annotations
+
+import cProfile
+from collections import deque
+from contextlib import contextmanager, nullcontext
+import time
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+# The phases timed during a turn, in the order they happen.
+PHASES = ("perform", "enemy_turns", "fov", "render")
+
+_NULL_PHASE = nullcontext()
+
+
+class TurnProfiler:
+    """
+    Keeps a rolling window of how long each phase of a turn took.
+
+    Timing is off until `enabled` is set, and then costs a couple of clock reads
+    per phase.  Separately a cProfile capture of the next few turns can be written
+    to a file with `capture`.
+    """
+
+    def __init__(self, window: int = 240):
+        self.enabled = False
+        self.window = window
+        self.samples: Dict[str, Deque[float]] = {
+            phase: deque(maxlen=window) for phase in PHASES
+        }
+        self.turns = 0
+
+        self._profile: Optional[cProfile.Profile] = None
+        self._profile_turns_left = 0
+        self._profile_filename = ""
+
+    def __getstate__(self) -> dict:
+        """Leave out any running capture, which can't be saved with the game."""
+        state = self.__dict__.copy()
+        state["_profile"] = None
+        state["_profile_turns_left"] = 0
+        return state
+
+    def toggle(self) -> None:
+        self.enabled = not self.enabled
+
+    def phase(self, name: str):
+        """Return a context which times everything inside it as `name`."""
+        if not self.enabled:
+            return _NULL_PHASE
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[name].append(time.perf_counter() - start)
+
+    def percentiles(self, name: str) -> Tuple[float, float]:
+        """Return the 50th and 99th percentile of the phase `name`, in seconds."""
+        samples = self.samples[name]
+        if not samples:
+            return 0.0, 0.0
+        p50, p99 = np.percentile(samples, [50, 99])
+        return float(p50), float(p99)
+
+    def report(self) -> List[Tuple[str, float, float, int]]:
+        """Return the phase name, p50, p99 and sample count of every phase."""
+        return [
+            (phase, *self.percentiles(phase), len(self.samples[phase]))
+            for phase in PHASES
+        ]
+
+    @property
+    def capturing(self) -> bool:
+        return self._profile is not None
+
+    def capture(self, turns: int, filename: str) -> None:
+        """Run cProfile over the next `turns` turns and then write it to `filename`."""
+        if self._profile is not None:
+            self._profile.disable()
+        self._profile = cProfile.Profile()
+        self._profile_turns_left = turns
+        self._profile_filename = filename
+        self._profile.enable()
+
+    def end_turn(self) -> Optional[str]:
+        """Called after every turn.
+
+        Returns the filename of a cProfile capture if one finished on this turn.
+        """
+        self.turns += 1
+
+        if self._profile is None:
+            return None
+        self._profile_turns_left -= 1
+        if self._profile_turns_left > 0:
+            return None
+
+        self._profile.disable()
+        self._profile.dump_stats(self._profile_filename)
+        self._profile = None
+        return self._profile_filename
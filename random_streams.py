@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import numpy as np  # type: ignore
+
+# Every stream is identified by a fixed number, so adding a stream never changes
+# the draws made by the existing ones.
+STREAM_IDS = {
+    "mapgen": 0,
+    "loot": 1,
+    "ai": 2,
+}
+
+
+class RandomStreams:
+    """
+    Independent random generators for each part of the game, all derived from a
+    single seed.
+
+    Map generation and loot get a new generator for every floor, so a floor is the
+    same no matter what happened on the floors before it.  The AI has a single
+    generator for the whole game.  Draws from one stream never change the draws
+    of another, so for example an extra AI decision doesn't change the next floor.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        # Without a seed the entropy is random, but kept so the game can be saved
+        # and still produce the same streams when loaded.
+        self.entropy = np.random.SeedSequence(seed).entropy
+        self._streams: Dict[str, np.random.Generator] = {}
+
+    def generator(self, name: str, *keys: int) -> np.random.Generator:
+        """Return a new generator for the stream `name`, split further by `keys`.
+
+        The same name and keys always give a generator with the same draws.
+        """
+        seed_sequence = np.random.SeedSequence(
+            self.entropy, spawn_key=(STREAM_IDS[name], *keys)
+        )
+        return np.random.Generator(np.random.PCG64(seed_sequence))
+
+    def mapgen(self, floor: int) -> np.random.Generator:
+        return self.generator("mapgen", floor)
+
+    def loot(self, floor: int) -> np.random.Generator:
+        return self.generator("loot", floor)
+
+    @property
+    def ai(self) -> np.random.Generator:
+        """The generator used for AI decisions, which carries on between turns."""
+        if "ai" not in self._streams:
+            self._streams["ai"] = self.generator("ai")
+        return self._streams["ai"]
@@ -0,0 +1,227 @@
+"""Recording of a play session's input, so the session can be replayed exactly.
+
+A recording is a compact binary stream.  It starts with a header holding the
+seed of the game, followed by one record per dispatched event, a record every
+time the screen was drawn and a record naming every action which used up a
+turn.  Replaying feeds the events back through the same handler chain, drawing
+to an offscreen console instead of a window, and checks that the same actions
+come out.  Only new games replay, since a continued game depends on a save file.
+"""
+from __future__ import annotations
+
+import struct
+import time
+import traceback
+from typing import BinaryIO, Iterator, List, Tuple, Union
+
+import tcod
+
+import color
+import exceptions
+import input_handlers
+
+MAGIC = b"COVREC"
+VERSION = 1
+
+_HEADER = struct.Struct("<6sBq")
+
+# Record kinds, each followed by its own fields.
+KEYDOWN = 1
+MOUSEMOTION = 2
+MOUSEBUTTONDOWN = 3
+QUIT = 4
+FRAME = 5
+ACTION = 6
+
+_KIND = struct.Struct("<B")
+_FIELDS = {
+    KEYDOWN: struct.Struct("<iiH"),  # scancode, sym, mod
+    MOUSEMOTION: struct.Struct("<hh"),  # tile x, y
+    MOUSEBUTTONDOWN: struct.Struct("<hhB"),  # tile x, y, button
+    QUIT: struct.Struct("<"),
+    FRAME: struct.Struct("<"),
+    ACTION: struct.Struct("<B"),  # length of the action name which follows
+}
+
+Record = Union[tcod.event.Event, str, None]
+"""An event to dispatch, the name of an action, or None for a frame."""
+
+
+class ReplayError(Exception):
+    """Raised when a recording can't be read, or replays differently."""
+
+
+class InputRecorder:
+    """Writes the events and actions of a session to `filename`."""
+
+    def __init__(self, filename: str, seed: int):
+        self.seed = seed
+        self._file: BinaryIO = open(filename, "wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION, seed))
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> InputRecorder:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def _write(self, kind: int, *fields: int) -> None:
+        self._file.write(_KIND.pack(kind) + _FIELDS[kind].pack(*fields))
+
+    def record_event(self, event: tcod.event.Event) -> None:
+        """Record `event`, if it is of a kind the handlers respond to."""
+        if isinstance(event, tcod.event.KeyDown):
+            self._write(KEYDOWN, event.scancode, event.sym, event.mod)
+        elif isinstance(event, tcod.event.MouseMotion):
+            self._write(MOUSEMOTION, *event.tile)
+        elif isinstance(event, tcod.event.MouseButtonDown):
+            self._write(MOUSEBUTTONDOWN, *event.tile, event.button)
+        elif isinstance(event, tcod.event.Quit):
+            self._write(QUIT)
+
+    def record_frame(self) -> None:
+        self._write(FRAME)
+
+    def record_action(self, action: object) -> None:
+        """Record the name of an action which took a turn."""
+        name = type(action).__name__.encode()
+        self._write(ACTION, len(name))
+        self._file.write(name)
+
+    def attach(self, handler: input_handlers.BaseEventHandler) -> None:
+        """Have the engine of `handler`, if any, report its actions here."""
+        if isinstance(handler, input_handlers.EventHandler):
+            handler.engine.recorder = self
+
+
+def read_recording(filename: str) -> Tuple[int, List[Record]]:
+    """Return the seed and all the records of a recording."""
+    with open(filename, "rb") as f:
+        data = f.read()
+
+    if len(data) < _HEADER.size:
+        raise ReplayError(f"{filename} is too short to be a recording.")
+    magic, version, seed = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ReplayError(f"{filename} is not a recording.")
+    if version != VERSION:
+        raise ReplayError(f"{filename} is version {version}, expected {VERSION}.")
+
+    records: List[Record] = []
+    offset = _HEADER.size
+    while offset < len(data):
+        (kind,) = _KIND.unpack_from(data, offset)
+        fields = _FIELDS.get(kind)
+        if fields is None:
+            raise ReplayError(f"Unknown record kind {kind} at byte {offset}.")
+        values = fields.unpack_from(data, offset + _KIND.size)
+        offset += _KIND.size + fields.size
+
+        if kind == KEYDOWN:
+            records.append(tcod.event.KeyDown(*values))
+        elif kind == MOUSEMOTION:
+            records.append(tcod.event.MouseMotion(tile=values))
+        elif kind == MOUSEBUTTONDOWN:
+            records.append(
+                tcod.event.MouseButtonDown(tile=values[:2], button=values[2])
+            )
+        elif kind == QUIT:
+            records.append(tcod.event.Quit())
+        elif kind == FRAME:
+            records.append(None)
+        else:
+            (length,) = values
+            records.append(data[offset : offset + length].decode())
+            offset += length
+
+    return seed, records
+
+
+class Replayer:
+    """
+    Plays a recording back as fast as possible, timing every turn.
+
+    A turn's time is everything between the end of the turn before it and the
+    action which ended it, so it includes dispatching the events and drawing the
+    frames in between.  The first turn is timed from when the game has started,
+    so building the first floor isn't counted.
+    """
+
+    def __init__(self, filename: str, width: int = 80, height: int = 50):
+        self.seed, self.records = read_recording(filename)
+        self.console = tcod.Console(width, height, order="F")
+        self.turn_times: List[float] = []
+        self._expected: Iterator[str] = iter(())
+        self._turn_start = 0.0
+
+    def record_action(self, action: object) -> None:
+        """Called by the engine for every action which took a turn."""
+        now = time.perf_counter()
+        self.turn_times.append(now - self._turn_start)
+        self._turn_start = now
+
+        name = type(action).__name__
+        expected = next(self._expected, None)
+        if name != expected:
+            raise ReplayError(
+                f"Turn {len(self.turn_times)} performed {name},"
+                f" but the recording has {expected}."
+            )
+
+    def run(self) -> List[float]:
+        """Replay the whole recording and return the time of every turn.
+
+        The replay stops at a quit, or once the player has died, so replaying
+        never touches the save file.
+        """
+        from setup_game import MainMenu
+
+        self._expected = iter(
+            [record for record in self.records if isinstance(record, str)]
+        )
+        handler: input_handlers.BaseEventHandler = MainMenu(seed=self.seed)
+        self._turn_start = time.perf_counter()
+
+        for record in self.records:
+            if isinstance(handler, input_handlers.GameOverEventHandler):
+                break
+            if record is None:
+                self.console.clear()
+                handler.on_render(console=self.console)
+            elif isinstance(record, tcod.event.Event):
+                if isinstance(record, tcod.event.Quit):
+                    break
+                try:
+                    handler = handler.handle_events(record)
+                except (SystemExit, exceptions.QuitWithoutSaving):
+                    break
+                except ReplayError:
+                    raise
+                except Exception:
+                    # The same as the main loop, so the replay carries on as the
+                    # recorded game did.
+                    if isinstance(handler, input_handlers.EventHandler):
+                        handler.engine.message_log.add_message(
+                            traceback.format_exc(), color.error
+                        )
+                self.attach(handler)
+
+        missing = next(self._expected, None)
+        if missing is not None:
+            raise ReplayError(
+                f"The replay ended after {len(self.turn_times)} turns,"
+                f" but the recording goes on with {missing}."
+            )
+        return self.turn_times
+
+    def attach(self, handler: input_handlers.BaseEventHandler) -> None:
+        if (
+            isinstance(handler, input_handlers.EventHandler)
+            and handler.engine.recorder is not self
+        ):
+            handler.engine.recorder = self
+            # The game has just started.
+            self._turn_start = time.perf_counter()
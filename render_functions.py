@@ -8,6 +8,7 @@ if TYPE_CHECKING:
     from tcod import Console
     from engine import Engine
     from game_map import GameMap
+    from profiling import TurnProfiler
 
 
 def get_names_at_location(x: int, y: int, game_map: GameMap) -> str:
@@ -59,3 +60,57 @@ def render_names_at_mouse_location(
     )
 
     console.print(x=x, y=y, string=names_at_mouse_location)
+
+
+def render_perf_overlay(console: Console, profiler: TurnProfiler) -> None:
+    """
+    Render the p50 and p99 time of each turn phase in the top right corner,
+    with a bar for each scaled to the slowest p99.
+    """
+    report = profiler.report()
+    width = 34
+    x = console.width - width
+    y = 0
+
+    console.draw_frame(
+        x=x,
+        y=y,
+        width=width,
+        height=len(report) + 3,
+        title="Turn timings (ms)",
+        clear=True,
+        fg=color.white,
+        bg=color.black,
+    )
+    console.print(x=x + 1, y=y + 1, string="phase         p50    p99", fg=color.white)
+
+    slowest = max(p99 for _, _, p99, _ in report) or 1.0
+    bar_width = width - 27
+
+    for i, (phase, p50, p99, _) in enumerate(report):
+        row = y + 2 + i
+        console.print(
+            x=x + 1,
+            y=row,
+            string=f"{phase:<11} {p50 * 1000:5.1f} {p99 * 1000:6.1f}",
+            fg=color.white,
+        )
+        console.draw_rect(
+            x=x + 26, y=row, width=bar_width, height=1, ch=1, bg=color.bar_empty
+        )
+        console.draw_rect(
+            x=x + 26,
+            y=row,
+            width=max(1, int(p99 / slowest * bar_width)),
+            height=1,
+            ch=1,
+            bg=color.enemy_die,
+        )
+        console.draw_rect(
+            x=x + 26,
+            y=row,
+            width=max(1, int(p50 / slowest * bar_width)),
+            height=1,
+            ch=1,
+            bg=color.bar_filled,
+        )
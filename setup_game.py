@@ -2,31 +2,51 @@
 from __future__ import annotations
 
 import copy
+import functools
 from game_map import GameWorld
 import lzma
 import pickle
 import traceback
-from typing import Optional
+from typing import Callable, Optional, TYPE_CHECKING
 
+import numpy as np  # type: ignore
 import tcod
 
 import color
-from engine import Engine
+from engine import Engine, SAVE_FILENAME
 import entity_factories
 import input_handlers
 from random import random
 
-# Load the background image and remove the alpha channel.
-background_image = tcod.image.load("resources/menu_background.png")[:, :, :3]
+if TYPE_CHECKING:
+    from floor_pack import FloorPack
 
 
-def new_game() -> Engine:
-    """Return a brand new game session as an Engine instance."""
-    map_width = 80
-    map_height = 43
+@functools.lru_cache(maxsize=None)
+def get_background_image() -> np.ndarray:
+    """Load the background image and remove the alpha channel.
 
+    This is done on first use rather than on import, so the window opens sooner.
+    """
+    return tcod.image.load("resources/menu_background.png")[:, :, :3]
+
+
+def new_game(
+    seed: Optional[int] = None,
+    map_width: int = 80,
+    map_height: int = 43,
+    floor_pack: Optional[FloorPack] = None,
+    progress_callback: Optional[Callable[[float], None]] = None,
+) -> Engine:
+    """Return a brand new game session as an Engine instance.
+
+    Passing the same `seed` will generate the same world.  The map can be larger
+    than the screen, in which case the view follows the player.  Floors are
+    loaded from `floor_pack` when it has them for `seed`.  `progress_callback` is
+    called with the fraction of the first floor built as it is built.
+    """
     player = copy.deepcopy(entity_factories.player)
-    engine = Engine(player=player)
+    engine = Engine(player=player, seed=seed)
 
     engine.game_world = GameWorld(
         max_rooms=30,
@@ -35,9 +55,10 @@ def new_game() -> Engine:
         map_width=map_width,
         map_height=map_height,
         engine=engine,
+        floor_pack=floor_pack,
     )
 
-    engine.game_world.generate_floor()
+    engine.game_world.generate_floor(progress_callback)
     engine.update_fov()
 
     engine.message_log.add_message(
@@ -68,11 +89,17 @@ def load_game(filename: str) -> Engine:
 
 
 class MainMenu(input_handlers.BaseEventHandler):
-    """Handle the main menu rendering and input."""
+    """Handle the main menu rendering and input.
+
+    New games are started with `seed`, or with a random seed if it is None.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = seed
 
     def on_render(self, console: tcod.Console) -> None:
         """Render the main menu on a background image."""
-        console.draw_semigraphics(background_image, 0, 0)
+        console.draw_semigraphics(get_background_image(), 0, 0)
 
         console.print(
             console.width // 4,
@@ -110,13 +137,19 @@ class MainMenu(input_handlers.BaseEventHandler):
             raise SystemExit()
         elif event.sym == tcod.event.K_c:
             try:
-                return input_handlers.MainGameEventHandler(load_game("savegame.sav"))
+                return input_handlers.MainGameEventHandler(load_game(SAVE_FILENAME))
             except FileNotFoundError:
                 return input_handlers.PopupMessage(self, "No saved game to load.")
             except Exception as exc:
                 traceback.print_exc()  # Print to stderr.
                 return input_handlers.PopupMessage(self, f"Failed to load save:\n{exc}")
         elif event.sym == tcod.event.K_n:
-            return input_handlers.MainGameEventHandler(new_game())
+            return input_handlers.ProgressHandler(
+                self,
+                "Generating the dungeon...",
+                lambda progress: input_handlers.MainGameEventHandler(
+                    new_game(seed=self.seed, progress_callback=progress)
+                ),
+            ).start()
 
         return None
@@ -1,4 +1,9 @@
+from __future__ import annotations
+
 from typing import List, Dict, TYPE_CHECKING, Tuple
+
+import numpy as np  # type: ignore
+
 import entity_factories
 from entity import Entity
 
@@ -27,3 +32,53 @@ enemy_chances: Dict[int, List[Tuple[Entity, int]]] = {
     5: [(entity_factories.orc, 30)],
     7: [(entity_factories.orc, 60)],
 }
+
+
+class FloorSpawnTable:
+    """The entities which can spawn on one floor, with their cumulative weights."""
+
+    def __init__(self, entities: List[Entity], weights: List[int]):
+        self.entities = entities
+        self.cumulative_weights = np.cumsum(weights, dtype=np.float64)
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Return `size` random indexes into `entities`, chosen by weight."""
+        if not self.entities or size <= 0:
+            return np.zeros(0, dtype=np.intp)
+        targets = rng.random(size) * self.cumulative_weights[-1]
+        return np.searchsorted(self.cumulative_weights, targets, side="right")
+
+
+class SpawnTable:
+    """
+    Weighted spawn chances which change with depth.
+
+    `chances` maps the first floor a chance applies on to a list of entities and
+    their weights.  A later floor can override the weight of an earlier entity.
+    The table for each floor is only worked out once.
+    """
+
+    def __init__(self, chances: Dict[int, List[Tuple[Entity, int]]]):
+        self.chances = chances
+        self._floors: Dict[int, FloorSpawnTable] = {}
+
+    def for_floor(self, floor: int) -> FloorSpawnTable:
+        try:
+            return self._floors[floor]
+        except KeyError:
+            pass
+
+        weights: Dict[Entity, int] = {}
+        for minimum_floor, values in sorted(self.chances.items()):
+            if minimum_floor > floor:
+                break
+            for entity, weight in values:
+                weights[entity] = weight
+
+        table = FloorSpawnTable(list(weights.keys()), list(weights.values()))
+        self._floors[floor] = table
+        return table
+
+
+item_spawn_table = SpawnTable(item_chances)
+enemy_spawn_table = SpawnTable(enemy_chances)
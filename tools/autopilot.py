@@ -0,0 +1,151 @@
+"""A scripted player used to drive game sessions without a window."""
+from __future__ import annotations
+
+from typing import List, Optional, TYPE_CHECKING
+
+from actions import (
+    Action,
+    EquipAction,
+    ItemAction,
+    MeleeAction,
+    MovementAction,
+    PickupAction,
+    TakeStairsAction,
+)
+from components.consumable import HealingConsumable
+from entity import Actor
+from equipment_types import EquipmentType
+
+if TYPE_CHECKING:
+    from distance_maps import DistanceMap
+    from engine import Engine
+    from entity import Item
+
+
+class Autopilot:
+    """Pick the player's next action.
+
+    The autopilot fights anything it can see, drinks potions when its health is low,
+    picks up items it walks over and otherwise heads for the down stairs.  Level ups
+    go to health, power and defense in turn.
+    """
+
+    def __init__(self, engine: Engine, heal_below: float = 0.5):
+        self.engine = engine
+        self.heal_below = heal_below
+
+    @property
+    def player(self) -> Actor:
+        return self.engine.player
+
+    def visible_enemies(self) -> List[Actor]:
+        game_map = self.engine.game_map
+        return [
+            actor
+            for actor in game_map.actors
+            if actor is not self.player and game_map.visible[actor.x, actor.y]
+        ]
+
+    def next_action(self) -> Optional[Action]:
+        """Return the action to take this turn.
+
+        Returns None if the player has nothing left to do on this floor, which
+        happens when the down stairs can't be reached.  A pending level up is taken
+        first, since it doesn't use up a turn.
+        """
+        player = self.player
+
+        level = player.level
+        if level.requires_level_up:
+            choices = (
+                level.increase_max_hp,
+                level.increase_power,
+                level.increase_defense,
+            )
+            choices[(level.current_level - 1) % len(choices)]()
+
+        if player.fighter.hp <= player.fighter.max_hp * self.heal_below:
+            potion = self.find_potion()
+            if potion:
+                return ItemAction(player, potion)
+
+        enemies = self.visible_enemies()
+        if enemies:
+            target = min(
+                enemies,
+                key=lambda actor: (
+                    max(abs(actor.x - player.x), abs(actor.y - player.y)),
+                    actor.x,
+                    actor.y,
+                ),
+            )
+            dx = target.x - player.x
+            dy = target.y - player.y
+            if max(abs(dx), abs(dy)) <= 1:
+                return MeleeAction(player, dx, dy)
+
+            action = self.step_towards(target.x, target.y)
+            if action:
+                return action
+
+        for item in self.engine.game_map.items:
+            if (item.x, item.y) == (player.x, player.y):
+                if len(player.inventory.items) < player.inventory.capacity:
+                    return PickupAction(player)
+
+        upgrade = self.find_upgrade()
+        if upgrade:
+            return EquipAction(player, upgrade)
+
+        downstairs = self.engine.game_map.downstairs
+        if (player.x, player.y) == downstairs:
+            return TakeStairsAction(player)
+
+        return self.step_downhill(self.engine.game_map.distance_maps.get([downstairs]))
+
+    def step_towards(self, x: int, y: int) -> Optional[Action]:
+        """Return a single step along the path to (x, y), if one exists."""
+        path = self.player.ai.get_path_to(x, y)
+        if not path:
+            return None
+        dest_x, dest_y = path[0]
+        return MovementAction(
+            self.player, dest_x - self.player.x, dest_y - self.player.y
+        )
+
+    def step_downhill(self, distances: DistanceMap) -> Optional[Action]:
+        """Return a step towards the goals of `distances`, if one is free."""
+        player = self.player
+        game_map = self.engine.game_map
+        for dest_x, dest_y in distances.downhill(player.x, player.y):
+            if not game_map.get_blocking_entity_at_location(dest_x, dest_y):
+                return MovementAction(player, dest_x - player.x, dest_y - player.y)
+        return None
+
+    def find_potion(self) -> Optional[Item]:
+        for item in self.player.inventory.items:
+            if isinstance(item.consumable, HealingConsumable):
+                return item
+        return None
+
+    def find_upgrade(self) -> Optional[Item]:
+        """Return an unequipped item which beats what is currently in its slot."""
+        equipment = self.player.equipment
+
+        for item in self.player.inventory.items:
+            if not item.equippable or equipment.item_is_equipped(item):
+                continue
+            if item.equippable.equipment_type == EquipmentType.WEAPON:
+                current = equipment.weapon
+            else:
+                current = equipment.armor
+            if current is None or score(item) > score(current):
+                return item
+
+        return None
+
+
+def score(item: Item) -> int:
+    if not item.equippable:
+        return 0
+    return item.equippable.power_bonus + item.equippable.defense_bonus
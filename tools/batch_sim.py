@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Play many headless games in parallel and collect their results.
+
+Each run is driven by the Autopilot from a single seed, until the player dies or
+reaches the floor cap.  The results are written as one column per statistic, so
+they can be loaded straight into a spreadsheet or numpy.
+
+Run from the repository root:
+
+    python -m tools.batch_sim --runs 200 --floors 10 --output results.csv
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import multiprocessing
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+from actions import TakeStairsAction, WaitAction
+import exceptions
+from floor_pack import FloorPack
+import setup_game
+from tools.autopilot import Autopilot
+
+COLUMNS = (
+    "seed",
+    "outcome",
+    "floor",
+    "turns",
+    "kills",
+    "damage_taken",
+    "forced_descents",
+    "budget_overruns",
+    "player_level",
+    "mapgen_time",
+    "ai_time",
+    "fov_time",
+    "total_time",
+)
+
+
+def count_kills(engine) -> int:
+    """Return the number of dead monsters on the current floor."""
+    return sum(1 for actor in engine.game_map.corpses if actor is not engine.player)
+
+
+def run_one(task: Tuple[int, int, int, Optional[str]]) -> Dict[str, object]:
+    """Play a single game from `seed` and return its statistics."""
+    seed, floor_cap, max_turns, pack_filename = task
+
+    start_time = time.perf_counter()
+    pack = FloorPack(pack_filename) if pack_filename else None
+    engine = setup_game.new_game(seed=seed, floor_pack=pack)
+    mapgen_time = time.perf_counter() - start_time
+    ai_time = 0.0
+    fov_time = 0.0
+
+    autopilot = Autopilot(engine)
+    player = engine.player
+    turns = kills = damage_taken = forced_descents = 0
+    outcome = "turn_cap"
+
+    try:
+        while turns < max_turns:
+            if not player.is_alive:
+                outcome = "died"
+                break
+            if engine.game_world.current_floor >= floor_cap:
+                outcome = "floor_cap"
+                break
+
+            action = autopilot.next_action()
+
+            if action is None:
+                # The stairs can't be reached, go down anyway so the run continues.
+                kills += count_kills(engine)
+                forced_descents += 1
+                t = time.perf_counter()
+                engine.game_world.generate_floor()
+                mapgen_time += time.perf_counter() - t
+                t = time.perf_counter()
+                engine.update_fov()
+                fov_time += time.perf_counter() - t
+                continue
+
+            hp_before = player.fighter.hp
+            if isinstance(action, TakeStairsAction):
+                kills += count_kills(engine)
+                t = time.perf_counter()
+                action.perform()
+                mapgen_time += time.perf_counter() - t
+            else:
+                try:
+                    action.perform()
+                except exceptions.Impossible:
+                    WaitAction(player).perform()
+            hp_after_action = player.fighter.hp
+
+            t = time.perf_counter()
+            engine.handle_enemy_turns()
+            ai_time += time.perf_counter() - t
+
+            t = time.perf_counter()
+            engine.update_fov()
+            fov_time += time.perf_counter() - t
+
+            damage_taken += max(0, hp_before - hp_after_action)
+            damage_taken += max(0, hp_after_action - player.fighter.hp)
+            turns += 1
+
+        kills += count_kills(engine)
+    except Exception as exc:
+        outcome = f"error: {type(exc).__name__}: {exc}"
+
+    return {
+        "seed": seed,
+        "outcome": outcome,
+        "floor": engine.game_world.current_floor,
+        "turns": turns,
+        "kills": kills,
+        "damage_taken": damage_taken,
+        "forced_descents": forced_descents,
+        "budget_overruns": sum(engine.game_world.budget_overruns.values()),
+        "player_level": player.level.current_level,
+        "mapgen_time": mapgen_time,
+        "ai_time": ai_time,
+        "fov_time": fov_time,
+        "total_time": time.perf_counter() - start_time,
+    }
+
+
+def run_batch(
+    seeds: List[int],
+    floor_cap: int,
+    max_turns: int,
+    processes: int,
+    pack_filename: Optional[str] = None,
+) -> Dict[str, List[object]]:
+    """Run one game per seed across a pool of processes.
+
+    Floors are loaded from the floor pack `pack_filename` when it has them.
+    Returns the results as a column table, in the same order as `seeds`.
+    """
+    tasks = [(seed, floor_cap, max_turns, pack_filename) for seed in seeds]
+    table: Dict[str, List[object]] = {column: [] for column in COLUMNS}
+
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.imap(run_one, tasks):
+            for column in COLUMNS:
+                table[column].append(result[column])
+
+    return table
+
+
+def write_table(table: Dict[str, List[object]], filename: str) -> None:
+    """Write a column table as either a `.npz` or `.csv` file."""
+    if filename.endswith(".npz"):
+        np.savez(filename, **{column: np.array(table[column]) for column in COLUMNS})
+        return
+
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(zip(*(table[column] for column in COLUMNS)))
+
+
+def print_summary(table: Dict[str, List[object]]) -> None:
+    runs = len(table["seed"])
+    outcomes: Dict[str, int] = {}
+    for outcome in table["outcome"]:
+        key = str(outcome).split(":")[0]
+        outcomes[key] = outcomes.get(key, 0) + 1
+
+    print(f"{runs} runs: " + ", ".join(f"{n} {k}" for k, n in outcomes.items()))
+    for column in ("floor", "turns", "kills", "damage_taken", "budget_overruns"):
+        values = np.array(table[column], dtype=float)
+        print(f"  {column:<15} mean {values.mean():8.2f}  max {values.max():8.0f}")
+    for column in ("mapgen_time", "ai_time", "fov_time", "total_time"):
+        values = np.array(table[column], dtype=float)
+        print(f"  {column:<15} mean {values.mean():8.4f}s total {values.sum():8.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=100, help="number of games")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--floors", type=int, default=10, help="floor cap")
+    parser.add_argument(
+        "--max-turns", type=int, default=5000, help="turn cap for a single game"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=None, help="worker count (default: all cores)"
+    )
+    parser.add_argument(
+        "--output", default="results.csv", help="a .csv or .npz file to write"
+    )
+    parser.add_argument(
+        "--floor-pack", help="load floors from this pack instead of building them"
+    )
+    args = parser.parse_args()
+
+    seeds = list(range(args.seed, args.seed + args.runs))
+    start_time = time.perf_counter()
+    table = run_batch(
+        seeds, args.floors, args.max_turns, args.processes, args.floor_pack
+    )
+    elapsed = time.perf_counter() - start_time
+
+    write_table(table, args.output)
+    print_summary(table)
+    print(f"Finished in {elapsed:.2f}s, results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
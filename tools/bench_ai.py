@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Time enemy turns with many monsters, planned serially and on threads.
+
+Monsters are spread over an open map with scattered pillars, and every one of
+them can see the player, so they all plan a chase every turn.  Each worker
+count plays the same turns from the same start, and the final positions must
+match the serial run, since plans are resolved in the same order however they
+were made.
+
+Run from the repository root:
+
+    python -m tools.bench_ai --monsters 500 --turns 50 --workers 0 2 4
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import time
+from typing import List, Tuple
+
+import numpy as np  # type: ignore
+
+from engine import Engine
+import entity_factories
+from game_map import GameMap
+import tile_types
+
+
+def make_floor(width: int, height: int, monsters: int, workers: int) -> Engine:
+    """Return an engine with `monsters` orcs on an open floor around the player."""
+    rng = np.random.default_rng(0)
+    player = copy.deepcopy(entity_factories.player)
+    engine = Engine(player=player, ai_workers=workers)
+    engine.game_map = game_map = GameMap(engine, width, height, entities=[player])
+    game_map.set_tiles((slice(1, -1), slice(1, -1)), tile_types.floor)
+    pillars = rng.random((width, height)) < 0.1
+    pillars[width // 2 - 1 : width // 2 + 2, height // 2 - 1 : height // 2 + 2] = False
+    game_map.set_tiles(pillars, tile_types.wall)
+    player.place(width // 2, height // 2, game_map)
+    player.fighter.max_hp = player.fighter.hp = 10**9
+
+    cells = np.argwhere(game_map.tiles["walkable"])
+    cells = cells[(cells[:, 0] != player.x) | (cells[:, 1] != player.y)]
+    for x, y in rng.choice(cells, size=monsters, replace=False).tolist():
+        entity_factories.orc.spawn(game_map, x, y)
+
+    # Every monster can see the player, however far away.
+    game_map.visible[:] = True
+    return engine
+
+
+def play(engine: Engine, turns: int) -> Tuple[List[float], List[Tuple[int, int]]]:
+    """Return the time of each enemy turn and where the monsters ended up."""
+    times = []
+    for _ in range(turns):
+        # A new position every turn, so the shared distance map is recomputed.
+        engine.game_map.distance_maps.invalidate()
+        start = time.perf_counter()
+        engine.handle_enemy_turns()
+        times.append(time.perf_counter() - start)
+    positions = sorted((actor.x, actor.y) for actor in engine.game_map.actors)
+    return times, positions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--monsters", type=int, default=500)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--width", type=int, default=200)
+    parser.add_argument("--height", type=int, default=120)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[0, 2, 4], help="0 plans serially"
+    )
+    args = parser.parse_args()
+
+    serial_positions = None
+    for workers in args.workers:
+        engine = make_floor(args.width, args.height, args.monsters, workers)
+        times, positions = play(engine, args.turns)
+        if serial_positions is None:
+            serial_positions = positions
+        same = "same" if positions == serial_positions else "DIFFERENT"
+        p50, p95 = np.percentile(times, [50, 95]) * 1000
+        print(
+            f"workers {workers:>2}  turn p50 {p50:7.2f}ms  p95 {p95:7.2f}ms"
+            f"  final positions {same}"
+        )
+
+
+if __name__ == "__main__":
+    main()
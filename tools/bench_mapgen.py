@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""Benchmark every map builder over a range of map sizes and seeds.
+
+For each builder and size this records the median and 95th percentile build time,
+the peak memory allocated during a build, the fraction of the map which is floor
+and how well connected that floor is.  A build which runs past the deadline is
+abandoned and counted as an error.  The report is written as JSON, and can be
+compared against a previously saved baseline.  Any regression makes the script exit
+with a non-zero status.
+
+Timings only compare on the same machine, so no baseline is kept in the
+repository.  Save one before making a change, then compare against it after,
+running from the repository root:
+
+    python -m tools.bench_mapgen --save-baseline mapgen_baseline.json
+    python -m tools.bench_mapgen --baseline mapgen_baseline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np  # type: ignore
+from scipy import ndimage
+
+from engine import Engine
+import entity_factories
+import exceptions
+from game_map import GameMap, GameWorld
+import map_builders
+from map_builders import MapBuilder
+
+# DLAMapBuilder is left out.  The game doesn't use it, and it fails on most map
+# sizes, or only keeps a handful of floor tiles when it doesn't.
+BUILDERS: Dict[str, Type[MapBuilder]] = {
+    "bsp": map_builders.BSPMapBuilder,
+    "bsp_interior": map_builders.BSPInteriorMapBuilder,
+    "cellular": map_builders.CellularMapBuilder,
+    "evil_cellular": map_builders.EvilCellularMapBuilder,
+    "simple": map_builders.SimpleMapBuilder,
+    "drunken": map_builders.DrunkenMapBuilder,
+    "maze": map_builders.MazeMapBuilder,
+}
+
+SIZES: List[Tuple[int, int]] = [
+    (80, 43),
+    (160, 86),
+    (320, 172),
+    (500, 500),
+    (1000, 1000),
+]
+
+
+def make_builder(
+    builder_cls: Type[MapBuilder],
+    width: int,
+    height: int,
+    seed: int,
+    deadline: Optional[float] = None,
+) -> MapBuilder:
+    """Return a builder attached to a fresh engine seeded with `seed`.
+
+    If `deadline` is given, building raises BuildTimeout at the first progress
+    report after that many seconds, unless the build is already done.
+    """
+    engine = Engine(player=copy.deepcopy(entity_factories.player), seed=seed)
+    engine.game_world = GameWorld(
+        engine=engine,
+        map_width=width,
+        map_height=height,
+        max_rooms=30,
+        room_min_size=6,
+        room_max_size=10,
+        current_floor=1,
+    )
+
+    builder = builder_cls(
+        max_rooms=30,
+        room_min_size=6,
+        room_max_size=10,
+        map_width=width,
+        map_height=height,
+        engine=engine,
+    )
+    if deadline is not None:
+        end_time = time.perf_counter() + deadline
+
+        def check_deadline(fraction: float) -> None:
+            if fraction < 1.0 and time.perf_counter() > end_time:
+                raise exceptions.BuildTimeout(
+                    f"passed the {deadline:g}s deadline at {fraction:.0%} done"
+                )
+
+        builder.progress_callback = check_deadline
+    return builder
+
+
+def measure_connectivity(dungeon: GameMap) -> Tuple[float, float, int]:
+    """Return the floor fraction, the fraction of floor reachable by the player,
+    and the number of separate floor regions.
+    """
+    walkable = dungeon.tiles["walkable"]
+    floor_count = int(np.count_nonzero(walkable))
+    if floor_count == 0:
+        return 0.0, 0.0, 0
+
+    labels, region_count = ndimage.label(walkable)
+    player = dungeon.engine.player
+    player_label = labels[player.x, player.y]
+    if player_label:
+        reachable = int(np.count_nonzero(labels == player_label))
+    else:
+        reachable = 0
+
+    return floor_count / walkable.size, reachable / floor_count, int(region_count)
+
+
+def bench_case(
+    name: str, width: int, height: int, seeds: List[int], deadline: float
+) -> Dict[str, object]:
+    """Benchmark a single builder at a single size over all `seeds`."""
+    builder_cls = BUILDERS[name]
+    times: List[float] = []
+    floor_fractions: List[float] = []
+    connected_fractions: List[float] = []
+    region_counts: List[int] = []
+    stage_times: Dict[str, List[float]] = {}
+    errors: List[str] = []
+
+    for seed in seeds:
+        builder = make_builder(builder_cls, width, height, seed, deadline)
+        builder.stage_timer.enabled = True
+        start_time = time.perf_counter()
+        try:
+            dungeon = builder.generate()
+        except Exception as exc:
+            errors.append(f"seed {seed}: {type(exc).__name__}: {exc}")
+            continue
+        times.append(time.perf_counter() - start_time)
+        for stage, seconds in builder.stage_timer.timings.items():
+            stage_times.setdefault(stage, []).append(seconds)
+
+        floor_fraction, connected_fraction, region_count = measure_connectivity(dungeon)
+        floor_fractions.append(floor_fraction)
+        connected_fractions.append(connected_fraction)
+        region_counts.append(region_count)
+
+    # Tracing allocations slows building down, so memory is measured separately.
+    peak_memory: Optional[int] = None
+    if times:
+        builder = make_builder(builder_cls, width, height, seeds[0], deadline)
+        tracemalloc.start()
+        try:
+            builder.generate()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        except Exception:
+            pass
+        finally:
+            tracemalloc.stop()
+
+    result: Dict[str, object] = {
+        "builder": name,
+        "width": width,
+        "height": height,
+        "runs": len(times),
+        "errors": errors,
+    }
+    if times:
+        result.update(
+            median=float(np.median(times)),
+            p95=float(np.percentile(times, 95)),
+            peak_memory=peak_memory,
+            floor_fraction=float(np.mean(floor_fractions)),
+            connected_fraction=float(np.mean(connected_fractions)),
+            regions=float(np.mean(region_counts)),
+            stages={
+                stage: float(np.median(seconds))
+                for stage, seconds in stage_times.items()
+            },
+        )
+    return result
+
+
+def run_benchmarks(
+    names: List[str],
+    sizes: List[Tuple[int, int]],
+    seeds: List[int],
+    time_limit: float,
+    deadline: float,
+) -> List[Dict[str, object]]:
+    """Run every builder over every size, smallest size first.
+
+    Once a builders median time passes `time_limit` seconds, or none of its
+    builds finish, the larger sizes are skipped for that builder, since they would
+    only take longer.
+    """
+    results = []
+    for name in names:
+        too_slow = False
+        for width, height in sorted(sizes, key=lambda size: size[0] * size[1]):
+            if too_slow:
+                results.append(
+                    {
+                        "builder": name,
+                        "width": width,
+                        "height": height,
+                        "runs": 0,
+                        "errors": [],
+                        "skipped": True,
+                    }
+                )
+                continue
+
+            result = bench_case(name, width, height, seeds, deadline)
+            results.append(result)
+            print(format_result(result), flush=True)
+
+            if (
+                not result["runs"]
+                or float(result["median"]) > time_limit  # type: ignore
+            ):
+                too_slow = True
+
+    return results
+
+
+def format_result(result: Dict[str, object]) -> str:
+    size = f"{result['width']}x{result['height']}"
+    line = f"{result['builder']:<14} {size:>10}"
+    if result.get("skipped"):
+        return f"{line}  skipped"
+    if not result["runs"]:
+        return f"{line}  failed: {result['errors'][0]}"  # type: ignore
+    # Tracing memory slows a build down, which can take it past the deadline.
+    peak_memory = result["peak_memory"]
+    peak = "n/a" if peak_memory is None else f"{peak_memory / 1024 ** 2:.2f}MiB"
+    line += (
+        f"  median {result['median']:9.4f}s  p95 {result['p95']:9.4f}s"
+        f"  peak {peak:>11}"
+        f"  floor {result['floor_fraction']:.2f}"
+        f"  connected {result['connected_fraction']:.2f}"
+    )
+    if result["errors"]:
+        line += f"  ({len(result['errors'])} errors)"  # type: ignore
+    return line
+
+
+def compare_to_baseline(
+    results: List[Dict[str, object]],
+    baseline: List[Dict[str, object]],
+    tolerance: float,
+    min_delta: float,
+) -> List[str]:
+    """Return a description of every result which regressed from the baseline.
+
+    A time regression must be both `tolerance` times slower and `min_delta` seconds
+    slower than the baseline, so that tiny noisy timings don't fail the comparison.
+    """
+    previous = {(r["builder"], r["width"], r["height"]): r for r in baseline}
+    regressions = []
+
+    for result in results:
+        key = (result["builder"], result["width"], result["height"])
+        old = previous.get(key)
+        if old is None or not old.get("runs") or result.get("skipped"):
+            continue
+        name = f"{key[0]} {key[1]}x{key[2]}"
+
+        if not result["runs"]:
+            regressions.append(f"{name}: now fails ({result['errors'][0]})")  # type: ignore
+            continue
+
+        for stat in ("median", "p95"):
+            new_value = float(result[stat])  # type: ignore
+            old_value = float(old[stat])  # type: ignore
+            if (
+                new_value > old_value * (1 + tolerance)
+                and new_value - old_value > min_delta
+            ):
+                regressions.append(
+                    f"{name}: {stat} {old_value:.4f}s -> {new_value:.4f}s"
+                )
+
+        new_memory = result.get("peak_memory")
+        old_memory = old.get("peak_memory")
+        if new_memory and old_memory and new_memory > old_memory * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak memory {old_memory} -> {new_memory} bytes"
+            )
+
+    return regressions
+
+
+def parse_size(text: str) -> Tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--builders",
+        nargs="+",
+        choices=list(BUILDERS),
+        default=list(BUILDERS),
+        help="builders to benchmark",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=parse_size,
+        default=SIZES,
+        help="map sizes given as WIDTHxHEIGHT",
+    )
+    parser.add_argument("--seeds", type=int, default=5, help="seeds per case")
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=30.0,
+        help="skip larger sizes once a builder takes longer than this many seconds",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=60.0,
+        help="abandon a single build after this many seconds",
+    )
+    parser.add_argument("--output", default="mapgen_report.json")
+    parser.add_argument("--baseline", help="a previous report to compare against")
+    parser.add_argument("--save-baseline", help="also write the report here")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed slowdown before a case counts as a regression",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.005,
+        help="ignore slowdowns smaller than this many seconds",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        args.builders,
+        args.sizes,
+        list(range(args.seeds)),
+        args.time_limit,
+        args.deadline,
+    )
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "seeds": args.seeds,
+        "results": results,
+    }
+
+    for filename in filter(None, (args.output, args.save_baseline)):
+        with open(filename, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_to_baseline(
+            results, baseline, args.tolerance, args.min_delta
+        )
+        if regressions:
+            print(f"{len(regressions)} regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
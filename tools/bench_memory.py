@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Measure how much memory each kind of entity and message takes.
+
+Every template in entity_factories is copied many times, the way spawning does,
+and the memory allocated for the copies is divided by the count.  The pickled
+size, which is what a save file grows by, is reported alongside it.
+
+With `--baseline` the templates are first turned into objects which keep their
+attributes in a __dict__, the way they did before __slots__, so the two can be
+compared:
+
+    python -m tools.bench_memory --count 5000 --baseline
+
+Run from the repository root:
+
+    python -m tools.bench_memory --count 5000
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import gc
+import json
+import pickle
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import color
+import entity_factories
+from entity import Entity
+from message_log import Message
+
+
+# The __dict__ backed stand ins for slotted classes, by the slotted class.
+_dict_classes: Dict[type, type] = {}
+
+
+def dict_class(cls: type) -> type:
+    """Return a class with the name of `cls` which keeps attributes in a __dict__.
+
+    It is added to this module, so that its instances can be pickled.
+    """
+    if cls not in _dict_classes:
+        name = f"Dict{cls.__name__}"
+        dict_cls = type(name, (), {"__module__": __name__})
+        globals()[name] = dict_cls
+        _dict_classes[cls] = dict_cls
+    return _dict_classes[cls]
+
+
+def slot_names(cls: type) -> List[str]:
+    names = []
+    for klass in cls.__mro__:
+        slots = vars(klass).get("__slots__", ())
+        names.extend([slots] if isinstance(slots, str) else slots)
+    return names
+
+
+def without_slots(obj: Any, memo: Dict[int, Any]) -> Any:
+    """Return a copy of `obj` where every slotted object is __dict__ backed."""
+    if id(obj) in memo:
+        return memo[id(obj)]
+    if isinstance(obj, list):
+        items: List[Any] = []
+        memo[id(obj)] = items
+        items.extend(without_slots(item, memo) for item in obj)
+        return items
+    if hasattr(obj, "__dict__") or not slot_names(type(obj)):
+        return obj  # Not slotted, such as numbers, strings and enums.
+
+    result = memo[id(obj)] = dict_class(type(obj))()
+    for name in slot_names(type(obj)):
+        if hasattr(obj, name):
+            setattr(result, name, without_slots(getattr(obj, name), memo))
+    return result
+
+
+def entity_factory(template: Entity, baseline: bool) -> Callable[[], object]:
+    if baseline:
+        template = without_slots(template, {})
+    return lambda: copy.deepcopy(template)
+
+
+def message_factory(baseline: bool) -> Callable[[], object]:
+    def factory() -> object:
+        message = Message("The Orc is engulfed in a fiery explosion!", color.white)
+        return without_slots(message, {}) if baseline else message
+
+    return factory
+
+
+def measure(factory: Callable[[], object], count: int) -> Dict[str, float]:
+    """Return the bytes allocated per object and the pickled bytes per object."""
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    objects: List[object] = [factory() for _ in range(count)]
+    allocated = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+
+    pickled = len(pickle.dumps(objects, protocol=pickle.HIGHEST_PROTOCOL))
+    return {"bytes": allocated / count, "pickled": pickled / count}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=5000, help="copies per kind")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument(
+        "--baseline",
+        action="store_true",
+        help="measure __dict__ backed copies, as before __slots__",
+    )
+    args = parser.parse_args()
+
+    kinds: Dict[str, Callable[[], object]] = {
+        name: entity_factory(template, args.baseline)
+        for name, template in vars(entity_factories).items()
+        if isinstance(template, Entity)
+    }
+    kinds["message"] = message_factory(args.baseline)
+
+    results = {}
+    print(f"{'kind':<20} {'bytes':>10} {'pickled':>10}")
+    for name, factory in kinds.items():
+        result = measure(factory, args.count)
+        results[name] = result
+        print(f"{name:<20} {result['bytes']:10.0f} {result['pickled']:10.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Build a pack of floors ahead of time, for loading instead of building live.
+
+For every seed the floors are built in order, the same way a new game with that
+seed builds them, so a game started with the pack and one of the packed seeds
+plays on exactly these floors.  Passing `--builders` instead builds every
+floor of every seed with each of the named builders, and a game only loads one
+of those floors if it picks the same builder for that floor.
+
+Run from the repository root:
+
+    python -m tools.build_floor_pack --seeds 100 --floors 10 --output floors.npz
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import multiprocessing
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np  # type: ignore
+
+from engine import Engine
+import entity_factories
+import floor_pack
+from game_map import FLOOR_BUILDERS, GameWorld
+
+Floor = Tuple[int, int, str, Dict[str, np.ndarray]]
+
+
+def build_floors(task: Tuple[int, Optional[str], int, int, int]) -> List[Floor]:
+    """Build the first `floors` floors of `seed`, with the builder named
+    `builder_name`, or with the games own choice of builder if it is None.
+    """
+    seed, builder_name, floors, width, height = task
+
+    engine = Engine(player=copy.deepcopy(entity_factories.player), seed=seed)
+    engine.game_world = GameWorld(
+        engine=engine,
+        map_width=width,
+        map_height=height,
+        max_rooms=30,
+        room_min_size=6,
+        room_max_size=10,
+        # The same step budget as a game, so packed floors are the ones it builds.
+    )
+
+    results = []
+    for _ in range(floors):
+        world = engine.game_world
+        world.current_floor += 1
+        # The same choice GameWorld.generate_floor makes.  It is drawn even when
+        # the builder is given, so the floor is built from the same generator
+        # state as a game which picks that builder.
+        rng = engine.rng_streams.mapgen(world.current_floor)
+        name = str(rng.choice(FLOOR_BUILDERS))
+        if builder_name is not None:
+            name = builder_name
+        world.build_floor(name, rng)
+        results.append(
+            (
+                seed,
+                world.current_floor,
+                name,
+                floor_pack.encode_floor(engine.game_map),
+            )
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seeds", type=int, default=10, help="number of seeds")
+    parser.add_argument("--seed", type=int, default=0, help="the first seed")
+    parser.add_argument("--floors", type=int, default=10, help="floors per seed")
+    parser.add_argument(
+        "--builders",
+        nargs="+",
+        choices=FLOOR_BUILDERS,
+        help="build every floor with each of these instead of the games choice",
+    )
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument("--height", type=int, default=43)
+    parser.add_argument(
+        "--processes", type=int, default=None, help="worker count (default: all cores)"
+    )
+    parser.add_argument("--output", default="floors.npz")
+    args = parser.parse_args()
+
+    builder_names: List[Optional[str]] = args.builders or [None]
+    tasks = [
+        (seed, builder_name, args.floors, args.width, args.height)
+        for seed in range(args.seed, args.seed + args.seeds)
+        for builder_name in builder_names
+    ]
+
+    start_time = time.perf_counter()
+    floors: List[Floor] = []
+    with multiprocessing.Pool(args.processes) as pool:
+        for results in pool.imap(build_floors, tasks):
+            floors.extend(results)
+
+    seeds, floor_numbers, builders, encoded = zip(*floors)
+    floor_pack.write_pack(args.output, seeds, floor_numbers, builders, encoded)
+    print(
+        f"Packed {len(floors)} floors in {time.perf_counter() - start_time:.2f}s,"
+        f" written to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
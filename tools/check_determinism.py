@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Check that replaying a seed gives a bit-identical game.
+
+Every seed is played several times by the Autopilot, each replay in a fresh
+worker process.  A digest of every floor's tiles and of every entity after each
+turn must match between the replays of a seed.  Each turn also checks that the
+maps collections of actors, corpses and items still match its entities.  The
+time each replay took is reported as well, and the spread between replays of
+the same seed should only be noise.  The script exits with a non-zero status if
+any seed differs.
+
+Run from the repository root:
+
+    python -m tools.check_determinism --seeds 5 --replays 3
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import multiprocessing
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np  # type: ignore
+
+from actions import WaitAction
+import exceptions
+import setup_game
+from tools.autopilot import Autopilot
+
+
+def digest_entities(engine, digest) -> None:
+    """Add the state of every entity on the current floor to `digest`."""
+    entities = sorted(
+        engine.game_map.entities, key=lambda entity: (entity.x, entity.y, entity.name)
+    )
+    for entity in entities:
+        digest.update(f"{entity.name},{entity.x},{entity.y};".encode())
+        fighter = getattr(entity, "fighter", None)
+        if fighter is not None:
+            digest.update(f"{fighter.hp},{fighter.power},{fighter.defense};".encode())
+
+
+def replay(task: Tuple[int, int, int]) -> Tuple[int, str, float]:
+    """Play `seed` and return it with the digest of the game and its run time."""
+    seed, floor_cap, max_turns = task
+    start_time = time.perf_counter()
+
+    engine = setup_game.new_game(seed=seed)
+    autopilot = Autopilot(engine)
+    digest = hashlib.sha256()
+    floor = 0
+
+    for _ in range(max_turns):
+        if engine.game_world.current_floor != floor:
+            floor = engine.game_world.current_floor
+            digest.update(engine.game_map.tiles.tobytes())
+        digest_entities(engine, digest)
+        engine.game_map.check_entity_collections()
+
+        if not engine.player.is_alive or floor >= floor_cap:
+            break
+
+        action = autopilot.next_action()
+        if action is None:
+            engine.game_world.generate_floor()
+            engine.update_fov()
+            continue
+        try:
+            action.perform()
+        except exceptions.Impossible:
+            WaitAction(engine.player).perform()
+        engine.handle_enemy_turns()
+        engine.update_fov()
+
+    for message in engine.message_log.messages:
+        digest.update(message.full_text.encode())
+
+    return seed, digest.hexdigest(), time.perf_counter() - start_time
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seeds", type=int, default=5, help="number of seeds")
+    parser.add_argument("--seed", type=int, default=0, help="the first seed")
+    parser.add_argument("--replays", type=int, default=3, help="replays per seed")
+    parser.add_argument("--floors", type=int, default=5, help="floor cap")
+    parser.add_argument("--max-turns", type=int, default=500)
+    parser.add_argument(
+        "--processes", type=int, default=None, help="worker count (default: all cores)"
+    )
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.seeds)
+    tasks = [
+        (seed, args.floors, args.max_turns)
+        for _ in range(args.replays)
+        for seed in seeds
+    ]
+
+    digests: Dict[int, List[str]] = {seed: [] for seed in seeds}
+    times: Dict[int, List[float]] = {seed: [] for seed in seeds}
+    # One task per process, so no replay can be affected by the one before it.
+    with multiprocessing.Pool(args.processes, maxtasksperchild=1) as pool:
+        for seed, digest, seconds in pool.imap_unordered(replay, tasks):
+            digests[seed].append(digest)
+            times[seed].append(seconds)
+
+    mismatches = 0
+    for seed in seeds:
+        identical = len(set(digests[seed])) == 1
+        mismatches += not identical
+        seed_times = np.array(times[seed])
+        spread = (seed_times.max() - seed_times.min()) / seed_times.mean()
+        print(
+            f"seed {seed:>4}  {'identical' if identical else 'DIFFERENT'}"
+            f"  {digests[seed][0][:12]}"
+            f"  mean {seed_times.mean():.3f}s  spread {spread:6.1%}"
+        )
+
+    if mismatches:
+        print(f"{mismatches} of {len(seeds)} seeds did not replay identically.")
+        sys.exit(1)
+    print(f"All {len(seeds)} seeds replayed identically.")
+
+
+if __name__ == "__main__":
+    main()
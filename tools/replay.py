@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Replay a recorded session as fast as possible and report its turn timings.
+
+Record a session by starting the game with `python main.py --record FILE`.
+Replaying the same recording on different versions of the code gives a
+repeatable measure of how long the turns of that session take.  The replay
+fails if the recording's actions no longer come out the same.
+
+Run from the repository root:
+
+    python -m tools.replay session.rec --output timings.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+import numpy as np  # type: ignore
+
+from recording import Replayer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="a file written by main.py --record")
+    parser.add_argument("--slowest", type=int, default=5, help="slow turns to list")
+    parser.add_argument("--output", help="write the time of every turn as JSON")
+    args = parser.parse_args()
+
+    replayer = Replayer(args.recording)
+    start_time = time.perf_counter()
+    turn_times = np.array(replayer.run())
+    total = time.perf_counter() - start_time
+
+    print(f"Replayed {len(turn_times)} turns of seed {replayer.seed} in {total:.3f}s")
+    if len(turn_times):
+        p50, p95, p99 = np.percentile(turn_times, [50, 95, 99]) * 1000
+        print(
+            f"turn  p50 {p50:.2f}ms  p95 {p95:.2f}ms  p99 {p99:.2f}ms"
+            f"  max {turn_times.max() * 1000:.2f}ms"
+        )
+        for turn in np.argsort(turn_times)[::-1][: args.slowest]:
+            print(f"  turn {turn + 1:>5}  {turn_times[turn] * 1000:8.2f}ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "seed": replayer.seed,
+                    "total_seconds": total,
+                    "turn_seconds": turn_times.tolist(),
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
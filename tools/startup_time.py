@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Report how long the game takes to get from launch to the main menu.
+
+This runs the game's imports under `python -X importtime` to list the slowest
+modules, and separately times a fresh interpreter importing the game and drawing
+the first menu frame.  Modules which should only load on the first floor, such
+as scipy and the map builders, are flagged if they are imported at startup.
+
+Run from the repository root:
+
+    python -m tools.startup_time
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np  # type: ignore
+
+# These should not be loaded before a floor is generated.
+DEFERRED_MODULES = ("scipy", "map_builders")
+
+FIRST_FRAME_SCRIPT = """
+import time
+start = time.perf_counter()
+import tcod
+import setup_game
+menu = setup_game.MainMenu()
+console = tcod.Console(80, 50, order="F")
+menu.on_render(console)
+print(time.perf_counter() - start)
+"""
+
+
+def import_times(module: str) -> List[Tuple[str, int, int]]:
+    """Return the name, self time and cumulative time of every module imported
+    by `module`, with times in microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        times.append((name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def first_frame_times(repeat: int) -> Tuple[List[float], List[float]]:
+    """Return the wall time of launching an interpreter which draws the menu,
+    and the part of that spent inside Python importing and rendering.
+    """
+    wall_times = []
+    in_process_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", FIRST_FRAME_SCRIPT],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        wall_times.append(time.perf_counter() - start)
+        in_process_times.append(float(result.stdout.split()[-1]))
+    return wall_times, in_process_times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main", help="module to import")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--repeat", type=int, default=5, help="first frame samples")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    total_us = next(
+        cumulative for name, _, cumulative in reversed(times) if name == args.module
+    )
+    deferred = sorted(
+        {name for name, _, _ in times if name.split(".")[0] in DEFERRED_MODULES}
+    )
+
+    print(f"Importing {args.module} takes {total_us / 1000:.1f}ms.")
+    print(f"Slowest {args.top} modules by self time:")
+    for name, self_us, cumulative_us in sorted(times, key=lambda t: -t[1])[: args.top]:
+        print(
+            f"  {self_us / 1000:7.1f}ms  (cumulative {cumulative_us / 1000:7.1f}ms)  {name}"
+        )
+    if deferred:
+        print(f"Imported at startup but should be deferred: {', '.join(deferred)}")
+
+    wall_times, in_process_times = first_frame_times(args.repeat)
+    print(
+        f"First menu frame: {np.median(wall_times) * 1000:.1f}ms from launch, "
+        f"{np.median(in_process_times) * 1000:.1f}ms of it importing and rendering."
+    )
+
+    if args.json:
+        report: Dict[str, object] = {
+            "module": args.module,
+            "import_ms": total_us / 1000,
+            "first_frame_ms": float(np.median(wall_times)) * 1000,
+            "first_frame_in_process_ms": float(np.median(in_process_times)) * 1000,
+            "deferred_modules_imported": deferred,
+            "modules": [
+                {"name": name, "self_ms": s / 1000, "cumulative_ms": c / 1000}
+                for name, s, c in times
+            ],
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()